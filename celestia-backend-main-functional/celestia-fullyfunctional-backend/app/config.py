@@ -1,37 +1,62 @@
-import os
+from functools import lru_cache
 
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
+    # Values are read once from the environment / .env by BaseSettings;
+    # the literals below are only fallbacks.
+
     # Google Configuration
-    google_api_key: str = os.getenv("GOOGLE_API_KEY", "")
-    google_client_id: str = os.getenv("GOOGLE_CLIENT_ID", "")
-    
+    google_api_key: str = ""
+    google_client_id: str = ""
+
     # Database Configuration
-    database_url: str = os.getenv("DATABASE_URL", "sqlite:///./test.db")
-    environment: str = os.getenv("ENVIRONMENT", "development")
-    
+    database_url: str = "sqlite:///./fitkit.db"
+    environment: str = "development"
+
     # Twilio Configuration
-    twilio_account_sid: str = os.getenv("TWILIO_ACCOUNT_SID", "")
-    twilio_auth_token: str = os.getenv("TWILIO_AUTH_TOKEN", "")
-    twilio_whatsapp_from: str = os.getenv("TWILIO_WHATSAPP_FROM", "whatsapp:+14155238886")
-    
+    twilio_account_sid: str = ""
+    twilio_auth_token: str = ""
+    twilio_whatsapp_from: str = "whatsapp:+14155238886"
+
     # Email Configuration
-    smtp_server: str = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-    smtp_port: int = int(os.getenv("SMTP_PORT", "587"))
-    smtp_username: str = os.getenv("SMTP_USERNAME", "")
-    smtp_password: str = os.getenv("SMTP_PASSWORD", "")
-    from_email: str = os.getenv("FROM_EMAIL", "noreply@fitkit.com")
-    
+    smtp_server: str = "smtp.gmail.com"
+    smtp_port: int = 587
+    smtp_username: str = ""
+    smtp_password: str = ""
+    from_email: str = "noreply@fitkit.com"
+
     # JWT Secret for OTP tokens
-    jwt_secret: str = os.getenv("JWT_SECRET", "your-secret-key-change-in-production")
-    
+    jwt_secret: str = "your-secret-key-change-in-production"
+
     # App Configuration
-    app_name: str = os.getenv("APP_NAME", "FITKIT")
-    app_url: str = os.getenv("APP_URL", "http://localhost:8000")
+    app_name: str = "FITKIT"
+    app_url: str = "http://localhost:8000"
+
+    # Analysis sessions (shared across workers when set)
+    redis_url: str = ""
+
+    # Seconds a generated chat reply is reused for an identical prompt
+    response_cache_ttl: int = 60 * 60
+
+    # Worker threads for blocking calls (Gemini, DB) made from async handlers and sync routes
+    worker_threads: int = 64
+
+    # Concurrent Gemini calls allowed from async handlers; the rest wait for a slot
+    gemini_max_concurrency: int = 16
+
+    # Upload limits
+    max_upload_bytes: int = 8 * 1024 * 1024
 
     class Config:
         env_file = ".env"
 
-settings = Settings()
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Build the settings object once per process"""
+    return Settings()
+
+
+settings = get_settings()
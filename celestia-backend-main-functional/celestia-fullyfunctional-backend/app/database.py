@@ -1,23 +1,32 @@
-import os
+from contextlib import contextmanager
+
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
+from app.config import settings
 
-# Use environment variable for database URL
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./fitkit.db")
+# Database URL comes from the shared settings object (env / .env)
+DATABASE_URL = settings.database_url
 
 # Handle PostgreSQL URL format for SQLAlchemy
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+if "sqlite" in DATABASE_URL:
+    engine = create_engine(
+        DATABASE_URL,
+        connect_args={"check_same_thread": False}
+    )
+else:
+    # Size the pool for concurrent request handlers instead of the 5-slot default
+    engine = create_engine(
+        DATABASE_URL,
+        pool_size=25,
+        max_overflow=25,
+        pool_pre_ping=True,
+        pool_recycle=1800
+    )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -27,3 +36,12 @@ def get_db():
         yield db
     finally:
         db.close()
+
+@contextmanager
+def session_scope():
+    """Short-lived session whose connection is released as soon as the block exits"""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -1,18 +1,113 @@
+import asyncio
+import hashlib
+import logging
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+
+import anyio.to_thread
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from app.routers import sessions, analysis, users, nutrition, recommendations, dashboard, agentic_ai, notifications
 from app.config import settings
 from app.database import Base, engine
-from app.models.db_models import User, Meal, DailySummary, NotificationLog
-from app.models.agentic_models import (
-    ConversationMemory, HealthAlert, SmartNotification, MealPlan, MealPlanItem,
-    UserBehaviorPattern, PredictiveInsight
-)
+from app.responses import ORJSONResponse
 from app.routers import agent
+from app.services.agent_service import HealthCoachAgent
 from app.services.scheduler_service import start_scheduler, stop_scheduler
 import atexit
 
-app = FastAPI(title="Smart Food Analyzer API")
+
+# Records which schema create_all last ran for, so restarts against a remote DB skip the table probes
+SCHEMA_MARKER = Path(".schema_ok")
+
+def init_schema() -> bool:
+    """Create missing tables; returns False when the marker shows nothing changed"""
+    # Register every model on Base.metadata before create_all
+    from app.models import db_models, agentic_models  # noqa: F401
+    
+    # Local SQLite files come and go (init_tables.py deletes them), so always check those
+    use_marker = "sqlite" not in settings.database_url
+    fingerprint = hashlib.sha256(
+        "|".join([settings.database_url, *sorted(Base.metadata.tables)]).encode()
+    ).hexdigest()
+    if use_marker and SCHEMA_MARKER.exists() and SCHEMA_MARKER.read_text() == fingerprint:
+        return False
+    
+    Base.metadata.create_all(bind=engine)
+    if use_marker:
+        SCHEMA_MARKER.write_text(fingerprint)
+    return True
+
+def start_log_queue() -> QueueListener:
+    """Move the root handlers behind a queue so request threads never block on log I/O"""
+    root = logging.getLogger()
+    handlers = root.handlers[:]
+    log_queue = queue.SimpleQueue()
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+def stop_log_queue(listener: QueueListener):
+    """Flush queued records and give the original handlers back to the root logger"""
+    listener.stop()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if isinstance(handler, QueueHandler):
+            root.removeHandler(handler)
+    for handler in listener.handlers:
+        root.addHandler(handler)
+
+def size_worker_threads():
+    """Let more blocking Gemini/DB calls overlap than the interpreter defaults allow"""
+    # asyncio.to_thread uses the loop's default executor; sync routes use anyio's limiter
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=settings.worker_threads, thread_name_prefix="worker")
+    )
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.worker_threads
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_listener = start_log_queue()
+    size_worker_threads()
+    
+    # Schema is owned by the migration scripts outside development/test
+    if settings.environment in ("development", "test"):
+        if await asyncio.to_thread(init_schema):
+            print("Database tables initialized on startup")
+    
+    # One agent for the whole process; routers pass their own DB session per call
+    app.state.health_agent = HealthCoachAgent()
+    
+    # Start the notification scheduler service
+    try:
+        start_scheduler()
+        print("Notification scheduler service started")
+    except Exception as e:
+        print(f"Failed to start scheduler service: {e}")
+    
+    yield
+    
+    # Stop the notification scheduler service
+    try:
+        stop_scheduler()
+        print("Notification scheduler service stopped")
+    except Exception as e:
+        print(f"Error stopping scheduler service: {e}")
+    
+    stop_log_queue(log_listener)
+
+app = FastAPI(
+    title="Smart Food Analyzer API",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
 
 # CORS configuration
 app.add_middleware(
@@ -24,34 +119,15 @@ app.add_middleware(
         "http://YOUR_COMPUTER_IP:8000",  # Replace with your IP
         "http://localhost:3000",
         "http://127.0.0.1:3000",
-        "https://your-frontend-domain.netlify.app",  # Replace with your actual domain
-        "*"  # Remove in production
+        "https://your-frontend-domain.netlify.app"  # Replace with your actual domain
     ],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
-@app.on_event("startup")
-def startup_event():
-    Base.metadata.create_all(bind=engine)
-    print("Database tables initialized on startup")
-    
-    # Start the notification scheduler service
-    try:
-        start_scheduler()
-        print("Notification scheduler service started")
-    except Exception as e:
-        print(f"Failed to start scheduler service: {e}")
-
-@app.on_event("shutdown")
-def shutdown_event():
-    # Stop the notification scheduler service
-    try:
-        stop_scheduler()
-        print("Notification scheduler service stopped")
-    except Exception as e:
-        print(f"Error stopping scheduler service: {e}")
+# Compress larger JSON payloads (meal history, dashboards); small responses go out as-is
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 # Register cleanup function for unexpected shutdowns
 atexit.register(stop_scheduler)
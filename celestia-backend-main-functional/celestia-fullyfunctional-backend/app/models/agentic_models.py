@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, JSON, DateTime, Date, Float, Boolean, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, JSON, DateTime, Date, Float, Boolean, Text, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -19,6 +19,12 @@ class ConversationMemory(Base):
     
     user = relationship("User")
 
+    # Session history / per-session trimming, and the recency+importance window (scanned backwards for DESC)
+    __table_args__ = (
+        Index("ix_cm_user_session_created", "user_id", "session_id", "created_at"),
+        Index("ix_cm_user_created_imp", "user_id", "created_at", "importance_score"),
+    )
+
 class HealthAlert(Base):
     """Store proactive health monitoring alerts"""
     __tablename__ = "health_alerts"
@@ -1,8 +1,14 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, JSON, DateTime, Date, Float, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, ForeignKey, JSON, DateTime, Date, Float, Boolean, Index
+from sqlalchemy.orm import relationship, validates
 from sqlalchemy.sql import func
 from app.database import Base
 
+# analysis_data keys mirrored onto Meal columns of the same name
+NUTRIENT_TOTAL_FIELDS = ("total_calories", "total_protein", "total_carbs", "total_fat", "total_fiber")
+
+# Indexed by date.weekday(); fixed English names, independent of the process locale
+DAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
 class User(Base):
     __tablename__ = "users"
     
@@ -46,15 +52,40 @@ class Meal(Base):
     portion_estimates = Column(JSON, default={})
     nutrition_summary = Column(JSON, default={})
     recommendations = Column(JSON, default={})
+    # Copied from analysis_data (see _copy_nutrient_totals) so aggregates sum plain columns
+    total_calories = Column(Float, default=0.0)
+    total_protein = Column(Float, default=0.0)
+    total_carbs = Column(Float, default=0.0)
+    total_fat = Column(Float, default=0.0)
+    total_fiber = Column(Float, default=0.0)
     meal_type = Column(String, nullable=True)  # breakfast, lunch, dinner, snack
     upload_date = Column(Date, server_default=func.current_date())
     upload_time = Column(DateTime(timezone=True), server_default=func.now())
-    day_of_week = Column(String, nullable=True)  # Monday, Tuesday, etc.
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     user = relationship("User", back_populates="meals")
 
+    @property
+    def day_of_week(self):
+        """Monday, Tuesday, etc.; derived from upload_date rather than stored"""
+        return DAY_NAMES[self.upload_date.weekday()] if self.upload_date else None
+
+    @validates("analysis_data")
+    def _copy_nutrient_totals(self, key, analysis_data):
+        """Keep the nutrient columns in step with analysis_data; missing or malformed values count as 0"""
+        for field in NUTRIENT_TOTAL_FIELDS:
+            try:
+                setattr(self, field, float((analysis_data or {}).get(field) or 0))
+            except (TypeError, ValueError, AttributeError):
+                setattr(self, field, 0.0)
+        return analysis_data
+
+    __table_args__ = (
+        # upload_time last so per-day meal lists come back already in time order
+        Index("ix_meals_user_date_time", "user_id", "upload_date", "upload_time"),
+    )
+
 class DailySummary(Base):
     __tablename__ = "daily_summaries"
     
@@ -74,6 +105,11 @@ class DailySummary(Base):
 
     user = relationship("User", back_populates="daily_summaries")
 
+    __table_args__ = (
+        # One summary per user and day; also the conflict target for the summary upsert
+        Index("uq_daily_summary_user_date", "user_id", "date", unique=True),
+    )
+
 class NotificationLog(Base):
     __tablename__ = "notification_logs"
     
@@ -90,3 +126,7 @@ class NotificationLog(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     user = relationship("User", back_populates="notifications")
+
+    __table_args__ = (
+        Index("ix_notif_user_created", "user_id", "created_at"),
+    )
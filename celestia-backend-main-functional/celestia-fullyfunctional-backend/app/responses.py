@@ -0,0 +1,16 @@
+from typing import Any, Dict, List
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson instead of the stdlib encoder"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def without_none(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Copy each row without its null-valued keys (clients treat a missing key as null)"""
+    return [{key: value for key, value in row.items() if value is not None} for row in rows]
@@ -1,16 +1,24 @@
-from fastapi import APIRouter, HTTPException, Depends, Body
+from fastapi import APIRouter, HTTPException, Depends, Body, Request
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.services.agent_service import HealthCoachAgent
 from typing import Dict, Any
 import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+def get_agent(request: Request) -> HealthCoachAgent:
+    """Shared agent built once at startup"""
+    return request.app.state.health_agent
+
 @router.post("/chat")
 async def chat_with_agent(
     request: Dict[str, Any] = Body(...),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    agent: HealthCoachAgent = Depends(get_agent)
 ):
     """
     Chat with the AI health coach agent
@@ -22,26 +30,22 @@ async def chat_with_agent(
         if not message:
             raise HTTPException(status_code=400, detail="Message is required")
         
-        # Initialize agent with database session
-        agent = HealthCoachAgent(db)
-        
         # Get response from agent
-        response = await agent.chat(message, context)
+        response = await agent.chat(message, context, db)
         
         return {"response": response}
         
     except Exception as e:
-        print(f"Agent chat error: {e}")
+        logger.exception("Agent chat error")
         raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
 
 @router.get("/daily_tip/{user_id}")
-def get_daily_tip(user_id: int, db: Session = Depends(get_db)):
+def get_daily_tip(user_id: int, db: Session = Depends(get_db), agent: HealthCoachAgent = Depends(get_agent)):
     """
     Get a personalized daily health tip
     """
     try:
-        agent = HealthCoachAgent(db)
-        user_context = agent.get_user_context(user_id)
+        user_context = agent.get_user_context(user_id, db)
         tip = agent.generate_daily_tip(user_context)
         
         return {"tip": tip}
@@ -50,13 +54,12 @@ def get_daily_tip(user_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Failed to generate tip: {str(e)}")
 
 @router.get("/insights/{user_id}")
-def get_user_insights(user_id: int, db: Session = Depends(get_db)):
+def get_user_insights(user_id: int, db: Session = Depends(get_db), agent: HealthCoachAgent = Depends(get_agent)):
     """
     Get nutritional insights and recommendations based on user's history
     """
     try:
-        agent = HealthCoachAgent(db)
-        user_context = agent.get_user_context(user_id)
+        user_context = agent.get_user_context(user_id, db)
         
         # Generate insights
         insights = {
@@ -3,8 +3,8 @@ from sqlalchemy.orm import Session
 from typing import Dict, Any, List, Optional
 from pydantic import BaseModel
 from app.database import get_db
-from app.services.enhanced_agent_service import EnhancedAgenticService
-from app.services.health_monitoring_service import HealthMonitoringService
+from app.services.enhanced_agent_service import EnhancedAgenticService, invalidate_health_dashboard
+from app.services.health_monitoring_service import HealthMonitoringService, URGENT_SEVERITIES
 from app.services.smart_notification_service import SmartNotificationService
 from app.services.intelligent_meal_planner import IntelligentMealPlanner
 from app.services.conversation_memory_service import ConversationMemoryService
@@ -82,7 +82,7 @@ async def get_health_dashboard(user_id: int, db: Session = Depends(get_db)):
     """
     try:
         enhanced_service = EnhancedAgenticService(db)
-        dashboard = enhanced_service.get_user_health_dashboard(user_id)
+        dashboard = await enhanced_service.get_user_health_dashboard(user_id)
         
         if dashboard.get('error'):
             raise HTTPException(status_code=500, detail=dashboard['error'])
@@ -188,6 +188,8 @@ async def mark_meal_completed(
         if not success:
             raise HTTPException(status_code=404, detail="Meal item not found or not accessible")
         
+        invalidate_health_dashboard(user_id)
+        
         return {
             'success': True,
             'message': 'Meal marked as completed',
@@ -230,7 +232,7 @@ async def get_health_alerts(user_id: int, db: Session = Depends(get_db)):
             'user_id': user_id,
             'active_alerts': alerts,
             'total_alerts': len(alerts),
-            'urgent_alerts': len([a for a in alerts if a['severity'] in ['high', 'critical']])
+            'urgent_alerts': sum(1 for a in alerts if a['severity'] in URGENT_SEVERITIES)
         }
         
     except Exception as e:
@@ -250,6 +252,8 @@ async def dismiss_alert(
         if not success:
             raise HTTPException(status_code=404, detail="Alert not found or not accessible")
         
+        invalidate_health_dashboard(user_id)
+        
         return {
             'success': True,
             'message': 'Alert dismissed',
@@ -273,6 +277,8 @@ async def mark_alert_read(
         if not success:
             raise HTTPException(status_code=404, detail="Alert not found or not accessible")
         
+        invalidate_health_dashboard(user_id)
+        
         return {
             'success': True,
             'message': 'Alert marked as read',
@@ -299,6 +305,8 @@ async def generate_smart_notifications(user_id: int, db: Session = Depends(get_d
         if results.get('error'):
             raise HTTPException(status_code=500, detail=results['error'])
         
+        invalidate_health_dashboard(user_id)
+        
         return NotificationResponse(**results)
         
     except Exception as e:
@@ -464,6 +472,7 @@ async def _generate_meal_plan_notifications(user_id: int, db: Session):
     try:
         notification_service = SmartNotificationService(db)
         notification_service.generate_smart_notifications(user_id)
+        invalidate_health_dashboard(user_id)
     except Exception as e:
         print(f"Error generating meal plan notifications: {e}")
 
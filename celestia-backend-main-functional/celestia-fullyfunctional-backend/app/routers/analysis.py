@@ -1,11 +1,6 @@
-def clean_session_data(session: dict) -> dict:
-    # Utility to remove non-serializable objects (like PIL Image) from session data
-    data = dict(session)
-    if 'image' in data:
-        data['image'] = None
-    return data
-
+import asyncio
 import io
+import logging
 from typing import Any, Dict, List, Optional
 
 from fastapi import (APIRouter, Body, Depends, File, HTTPException, Query,
@@ -13,61 +8,119 @@ from fastapi import (APIRouter, Body, Depends, File, HTTPException, Query,
 from PIL import Image
 from sqlalchemy.orm import Session
 
+from app.config import settings
 from app.database import get_db
 from app.models.pydantic_models import AnalysisResponse
 from app.routers.sessions import sessions
-from app.services.analysis_service import (analyze_food_image, explainability,
+from app.services.analysis_service import (MAX_IMAGE_EDGE,
+                                           analyze_food_image_async,
+                                           explainability,
                                            generate_clarifying_questions,
                                            portion_estimation,
                                            refine_analysis_with_answers)
 from app.services.nutrition_service import nutrition_lookup
 from app.services.recommendations_service import (healthy_swaps,
                                                   personalized_recommendations)
+from app.services.session_store import public_session_data
 from app.services.user_service import get_user, log_meal
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
+# Vision model input never needs more than this
+MAX_IMAGE_SIZE = (MAX_IMAGE_EDGE, MAX_IMAGE_EDGE)
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Refuse decompression bombs before PIL allocates the pixel buffer. PIL itself only raises above
+# twice its limit, so uploads are checked against MAX_IMAGE_PIXELS explicitly from the header.
+MAX_IMAGE_PIXELS = 25_000_000
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
     
 
-def validate_session(session_id: str):
-    if session_id not in sessions:
+def validate_session(session_id: str) -> Dict[str, Any]:
+    """Load the session; changes must be assigned back to ``sessions`` to persist"""
+    try:
+        return sessions[session_id]
+    except KeyError:
         raise HTTPException(status_code=404, detail="Session expired. Please start a new analysis.")
 
 
+def store_session(session_id: str, session: Dict[str, Any]):
+    sessions[session_id] = session
+
+
+# Async handlers reach the session store through these: with RedisSessionStore every read, write
+# and image transfer is a network round trip, which must not run on the event loop
+async def validate_session_async(session_id: str) -> Dict[str, Any]:
+    return await asyncio.to_thread(validate_session, session_id)
+
+
+async def store_session_async(session_id: str, session: Dict[str, Any]):
+    await asyncio.to_thread(store_session, session_id, session)
+
+
+def downscale_upload(upload) -> bytes:
+    """Validate the spooled upload and re-encode it as a JPEG capped at MAX_IMAGE_SIZE"""
+    # PIL reads straight from the spooled temp file
+    upload.seek(0)
+    probe = Image.open(upload)
+    if probe.width * probe.height > MAX_IMAGE_PIXELS:
+        raise HTTPException(status_code=413, detail="Image dimensions too large")
+    probe.verify()
+    upload.seek(0)
+    # Downscale once here so every later step works on a ~1024px JPEG
+    image = Image.open(upload)
+    image.thumbnail(MAX_IMAGE_SIZE, Image.Resampling.LANCZOS)
+    image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
 @router.post("/upload/{session_id}")
 async def upload_image(session_id: str, file: UploadFile = File(...)):
-    session = validate_session(session_id)
+    session = await validate_session_async(session_id)
     try:
         # Validate file type
         if not file.content_type or not file.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="Invalid file type. Please upload an image.")
-        image_bytes = await file.read()
-        if len(image_bytes) == 0:
+        # Size the spooled upload in chunks without copying it into one bytes object
+        total = 0
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            total += len(chunk)
+            if total > settings.max_upload_bytes:
+                raise HTTPException(status_code=413, detail="Image too large")
+        if total == 0:
             raise HTTPException(status_code=400, detail="Empty file uploaded")
-        image = Image.open(io.BytesIO(image_bytes))
-        sessions[session_id]["image"] = image
-        sessions[session_id]["step"] = "analyze"
+        # Decoding and re-encoding a large photo takes a while; keep it off the event loop
+        image_bytes = await asyncio.to_thread(downscale_upload, file.file)
+        session["image_path"] = await asyncio.to_thread(sessions.save_image, session_id, image_bytes)
+        session["step"] = "analyze"
+        await store_session_async(session_id, session)
         return {"message": "Image uploaded successfully"}
+    except HTTPException:
+        raise
+    except Image.DecompressionBombError:
+        raise HTTPException(status_code=413, detail="Image dimensions too large")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid image file: {str(e)}")
 
 
 @router.post("/analyze/{session_id}")
 async def analyze(session_id: str, user_id: Optional[int] = Query(None), db: Session = Depends(get_db)):
-    session = validate_session(session_id)
-    image = sessions[session_id].get("image")
-    if image is None:
+    session = await validate_session_async(session_id)
+    image_bytes = await asyncio.to_thread(sessions.load_image, session_id) if session.get("image_path") else None
+    if image_bytes is None:
         raise HTTPException(status_code=400, detail="No image uploaded for this session.")
     try:
         # Get user profile for dietary preferences
-        user_profile = {}
-        if user_id:
-            user = get_user(db, user_id)
-            if user:
-                user_profile = user.profile
+        user = await asyncio.to_thread(get_user, db, user_id) if user_id else None
+        user_profile = user.profile if user else {}
 
-        # Analyze image with user profile
-        analysis_data = analyze_food_image(image, user_profile)
+        # Analyze image with user profile; the upload is already a capped JPEG, so send its bytes as-is
+        analysis_data = await analyze_food_image_async(image_bytes, user_profile)
         if not analysis_data or not analysis_data.get('items'):
             return {
                 "message": "Analysis failed - no food detected",
@@ -85,42 +138,47 @@ async def analyze(session_id: str, user_id: Optional[int] = Query(None), db: Ses
                 }
             }
 
-        sessions[session_id]["analysis_data"] = analysis_data
-
-        # Process additional data
-        portion_estimates = portion_estimation(analysis_data)
-        sessions[session_id]["portion_estimates"] = portion_estimates
+        session["analysis_data"] = analysis_data
+        session["explanation"] = None
 
-        nutrition_summary = nutrition_lookup(analysis_data)
-        sessions[session_id]["nutrition_summary"] = nutrition_summary
+        # Portions, nutrition, swaps and personalized tips are independent model calls; run them concurrently
+        calls = [
+            asyncio.to_thread(portion_estimation, analysis_data),
+            asyncio.to_thread(nutrition_lookup, analysis_data),
+            asyncio.to_thread(healthy_swaps, analysis_data)
+        ]
+        if user:
+            calls.append(asyncio.to_thread(personalized_recommendations, analysis_data, user_profile))
+        portion_estimates, nutrition_summary, swaps, *personalized = await asyncio.gather(*calls)
+        session["portion_estimates"] = portion_estimates
+        session["nutrition_summary"] = nutrition_summary
 
         # Get recommendations
-        swaps = healthy_swaps(analysis_data)
         recommendations = {"swaps": swaps}
 
-        if user_id:
-            user = get_user(db, user_id)
-            if user:
-                personalized = personalized_recommendations(analysis_data, user.profile)
-                recommendations["personalized"] = personalized
-                try:
-                    log_meal(db, user_id, analysis_data, portion_estimates, nutrition_summary, recommendations)
-                except Exception as e:
-                    print(f"Failed to log meal: {e}")
+        if user:
+            recommendations["personalized"] = personalized[0]
+            try:
+                # Commit, summary upsert and cache invalidation are all blocking; keep them off the event loop
+                await asyncio.to_thread(log_meal, db, user_id, analysis_data, portion_estimates, nutrition_summary, recommendations)
+            except Exception as e:
+                logger.warning("Failed to log meal: %s", e)
 
-        sessions[session_id]["recommendations"] = recommendations
+        session["recommendations"] = recommendations
 
         # Check if clarification needed
         if analysis_data.get('need_clarification', False):
             questions = generate_clarifying_questions(analysis_data)
-            sessions[session_id]["questions"] = questions
-            sessions[session_id]["step"] = "clarify"
+            session["questions"] = questions
+            session["step"] = "clarify"
+            await store_session_async(session_id, session)
             return {
                 "message": "Analysis complete, clarification needed",
                 "questions": questions
             }
         else:
-            sessions[session_id]["step"] = "results"
+            session["step"] = "results"
+            await store_session_async(session_id, session)
             return {
                 "message": "Analysis complete",
                 "data": {
@@ -136,8 +194,9 @@ def skip_clarification(session_id: str):
     session = validate_session(session_id)
     
     try:
-        sessions[session_id]["step"] = "results"
-        return {"message": "Clarification skipped", "data": clean_session_data(sessions[session_id])}
+        session["step"] = "results"
+        sessions[session_id] = session
+        return {"message": "Clarification skipped", "data": public_session_data(session)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Skip clarification failed: {str(e)}")
 
@@ -145,20 +204,26 @@ def skip_clarification(session_id: str):
 def get_results(session_id: str):
     session = validate_session(session_id)
     
-    analysis_data = sessions[session_id].get("analysis_data")
+    analysis_data = session.get("analysis_data")
     if not analysis_data:
         raise HTTPException(status_code=400, detail="No analysis data found")
     
     try:
         # Ensure totals are calculated
-        items = analysis_data.get('items', [])
-        analysis_data["total_protein"] = sum(item.get('protein', 0) for item in items)
-        analysis_data["total_carbs"] = sum(item.get('carbs', 0) for item in items)
-        analysis_data["total_fat"] = sum(item.get('fat', 0) for item in items)
+        total_protein = total_carbs = total_fat = total_calories = 0
+        for item in analysis_data.get('items', []):
+            total_protein += item.get('protein', 0)
+            total_carbs += item.get('carbs', 0)
+            total_fat += item.get('fat', 0)
+            total_calories += item.get('calories', 0)
+        analysis_data["total_protein"] = total_protein
+        analysis_data["total_carbs"] = total_carbs
+        analysis_data["total_fat"] = total_fat
         
         if "total_calories" not in analysis_data:
-            analysis_data["total_calories"] = sum(item.get('calories', 0) for item in items)
+            analysis_data["total_calories"] = total_calories
         
+        sessions[session_id] = session
         return analysis_data
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get results: {str(e)}")
@@ -167,24 +232,31 @@ def get_results(session_id: str):
 def get_explanation(session_id: str):
     session = validate_session(session_id)
     
-    analysis_data = sessions[session_id].get("analysis_data")
+    analysis_data = session.get("analysis_data")
     if not analysis_data:
         raise HTTPException(status_code=400, detail="No analysis data found")
     
     try:
-        explanation = explainability(analysis_data)
+        # analysis_data only changes on analyze/refine, which reset this cache
+        explanation = session.get("explanation")
+        if explanation is None:
+            explanation = explainability(analysis_data)
+            # Don't pin a failed generation for the rest of the session
+            if not explanation.startswith("Unable to generate explanation"):
+                session["explanation"] = explanation
+                sessions[session_id] = session
         return {"explanation": explanation}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get explanation: {str(e)}")
     
 @router.post("/analyze_text/{session_id}")
-def analyze_text(
+async def analyze_text(
     session_id: str, 
     text: dict = Body(...), 
     user_id: Optional[int] = Query(None), 
     db: Session = Depends(get_db)
 ):
-    session = validate_session(session_id)
+    session = await validate_session_async(session_id)
     
     dish_text = text.get("text", "").strip()
     if not dish_text:
@@ -192,53 +264,55 @@ def analyze_text(
     
     try:
         # Get user profile for dietary preferences
-        user_profile = {}
-        if user_id:
-            user = get_user(db, user_id)
-            if user:
-                user_profile = user.profile
+        user = await asyncio.to_thread(get_user, db, user_id) if user_id else None
+        user_profile = user.profile if user else {}
         
         # Analyze text with user profile
-        analysis_data = analyze_food_image(dish_text, user_profile)
+        analysis_data = await analyze_food_image_async(dish_text, user_profile)
         if not analysis_data or not analysis_data.get('items'):
             raise HTTPException(status_code=500, detail="Text analysis failed - no items detected")
         
-        sessions[session_id]["analysis_data"] = analysis_data
-        
-        # Process additional data
-        portion_estimates = portion_estimation(analysis_data)
-        sessions[session_id]["portion_estimates"] = portion_estimates
+        session["analysis_data"] = analysis_data
+        session["explanation"] = None
         
-        nutrition_summary = nutrition_lookup(analysis_data)
-        sessions[session_id]["nutrition_summary"] = nutrition_summary
+        # Portions, nutrition, swaps and personalized tips are independent model calls; run them concurrently
+        calls = [
+            asyncio.to_thread(portion_estimation, analysis_data),
+            asyncio.to_thread(nutrition_lookup, analysis_data),
+            asyncio.to_thread(healthy_swaps, analysis_data)
+        ]
+        if user:
+            calls.append(asyncio.to_thread(personalized_recommendations, analysis_data, user_profile))
+        portion_estimates, nutrition_summary, swaps, *personalized = await asyncio.gather(*calls)
+        session["portion_estimates"] = portion_estimates
+        session["nutrition_summary"] = nutrition_summary
         
         # Get recommendations
-        swaps = healthy_swaps(analysis_data)
         recommendations = {"swaps": swaps}
         
-        if user_id:
-            user = get_user(db, user_id)
-            if user:
-                personalized = personalized_recommendations(analysis_data, user.profile)
-                recommendations["personalized"] = personalized
-                try:
-                    log_meal(db, user_id, analysis_data, portion_estimates, nutrition_summary, recommendations)
-                except Exception as e:
-                    print(f"Failed to log meal: {e}")
+        if user:
+            recommendations["personalized"] = personalized[0]
+            try:
+                # Commit, summary upsert and cache invalidation are all blocking; keep them off the event loop
+                await asyncio.to_thread(log_meal, db, user_id, analysis_data, portion_estimates, nutrition_summary, recommendations)
+            except Exception as e:
+                logger.warning("Failed to log meal: %s", e)
         
-        sessions[session_id]["recommendations"] = recommendations
+        session["recommendations"] = recommendations
         
         # Check if clarification needed
         if analysis_data.get('need_clarification', False):
             questions = generate_clarifying_questions(analysis_data)
-            sessions[session_id]["questions"] = questions
-            sessions[session_id]["step"] = "clarify"
+            session["questions"] = questions
+            session["step"] = "clarify"
+            await store_session_async(session_id, session)
             return {
                 "message": "Analysis complete, clarification needed",
                 "questions": questions
             }
         else:
-            sessions[session_id]["step"] = "results"
+            session["step"] = "results"
+            await store_session_async(session_id, session)
             return {
                 "message": "Analysis complete", 
                 "data": {
@@ -252,21 +326,24 @@ def analyze_text(
 @router.post("/refine/{session_id}")
 def refine_analysis(session_id: str, answers: List[str] = Body(...)):
     session = validate_session(session_id)
-    questions = sessions[session_id].get("questions", [])
+    questions = session.get("questions", [])
     # Allow single answer for bulk edit/refinement
+    bulk = False
     if len(answers) != len(questions):
         if len(answers) == 1 and len(questions) > 0:
             # Use the single answer for all questions (bulk correction)
-            answers = [answers[0]] * len(questions)
+            bulk = True
         else:
             raise HTTPException(status_code=400, detail="Mismatch in number of answers")
     try:
-        original_data = sessions[session_id]["analysis_data"]
-        refined_data = refine_analysis_with_answers(original_data, questions, answers)
+        original_data = session["analysis_data"]
+        refined_data = refine_analysis_with_answers(original_data, questions, answers, bulk=bulk)
         if not refined_data:
             refined_data = original_data
-        sessions[session_id]["analysis_data"] = refined_data
-        sessions[session_id]["step"] = "results"
-        return {"message": "Analysis refined", "data": clean_session_data(sessions[session_id])}
+        session["analysis_data"] = refined_data
+        session["explanation"] = None
+        session["step"] = "results"
+        sessions[session_id] = session
+        return {"message": "Analysis refined", "data": public_session_data(session)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis refinement failed: {str(e)}")
@@ -1,13 +1,31 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import get_db, session_scope
+from app.responses import ORJSONResponse, without_none
 from app.services.dashboard_service import DashboardService
 from typing import Dict, Any, Optional
 from datetime import date
 from pydantic import BaseModel
+import asyncio
+import logging
+import re
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
+_ISO_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+def parse_iso_date(value: str) -> date:
+    """Parse a YYYY-MM-DD query value, rejecting malformed input before fromisoformat"""
+    if not _ISO_DATE_RE.match(value):
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        # Well-formed but out of range, e.g. 2024-02-30
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+
 class GoalsRequest(BaseModel):
     calories: Optional[int] = 2000
     protein: Optional[int] = 50
@@ -15,103 +33,113 @@ class GoalsRequest(BaseModel):
     fat: Optional[int] = 65
     fiber: Optional[int] = 25
 
+# The read-only views below return ORJSONResponse directly: their payloads are
+# plain dicts/lists, so FastAPI's recursive jsonable_encoder pass can be skipped.
+
+def get_dashboard_service(db: Session = Depends(get_db)) -> DashboardService:
+    """Request-scoped DashboardService bound to the request's session"""
+    return DashboardService(db)
+
+def run_with_dashboard_service(fn):
+    """Run read-only dashboard work in its own session, closed before the response is built"""
+    with session_scope() as db:
+        return fn(DashboardService(db))
+
 @router.get("/daily/{user_id}")
-def get_daily_dashboard(
+async def get_daily_dashboard(
     user_id: int,
-    target_date: Optional[str] = None,
-    db: Session = Depends(get_db)
+    target_date: Optional[str] = None
 ):
     """Get daily dashboard with intake breakdown and goal achievement"""
     try:
-        dashboard_service = DashboardService(db)
-        
         # Parse date if provided
         parsed_date = None
         if target_date:
-            try:
-                parsed_date = date.fromisoformat(target_date)
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+            parsed_date = parse_iso_date(target_date)
         
-        dashboard_data = dashboard_service.get_daily_dashboard(user_id, parsed_date)
+        dashboard_data = await asyncio.to_thread(
+            run_with_dashboard_service,
+            lambda service: service.get_daily_dashboard(user_id, parsed_date)
+        )
         
         if not dashboard_data:
             raise HTTPException(status_code=404, detail="No data found for user")
         
-        return {
+        return ORJSONResponse({
             "status": "success",
             "data": dashboard_data
-        }
+        })
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Daily dashboard error: {e}")
+        logger.exception("Daily dashboard error")
         raise HTTPException(status_code=500, detail=f"Failed to get daily dashboard: {str(e)}")
 
 @router.get("/weekly/{user_id}")
-def get_weekly_dashboard(
+async def get_weekly_dashboard(
     user_id: int,
-    start_date: Optional[str] = None,
-    db: Session = Depends(get_db)
+    start_date: Optional[str] = None
 ):
     """Get weekly dashboard with trends and goal achievement"""
     try:
-        dashboard_service = DashboardService(db)
-        
         # Parse start date if provided
         parsed_start_date = None
         if start_date:
-            try:
-                parsed_start_date = date.fromisoformat(start_date)
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+            parsed_start_date = parse_iso_date(start_date)
         
-        dashboard_data = dashboard_service.get_weekly_dashboard(user_id, parsed_start_date)
+        dashboard_data = await asyncio.to_thread(
+            run_with_dashboard_service,
+            lambda service: service.get_weekly_dashboard(user_id, parsed_start_date)
+        )
         
-        return {
+        return ORJSONResponse({
             "status": "success",
             "data": dashboard_data
-        }
+        })
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Weekly dashboard error: {e}")
+        logger.exception("Weekly dashboard error")
         raise HTTPException(status_code=500, detail=f"Failed to get weekly dashboard: {str(e)}")
 
 @router.get("/monthly/{user_id}")
-def get_monthly_dashboard(
+async def get_monthly_dashboard(
     user_id: int,
     year: Optional[int] = None,
-    month: Optional[int] = None,
-    db: Session = Depends(get_db)
+    month: Optional[int] = None
 ):
     """Get monthly dashboard with comprehensive analytics"""
     try:
-        dashboard_service = DashboardService(db)
-        
         # Validate month if provided
         if month and (month < 1 or month > 12):
             raise HTTPException(status_code=400, detail="Month must be between 1 and 12")
         
-        dashboard_data = dashboard_service.get_monthly_dashboard(user_id, year, month)
+        dashboard_data = await asyncio.to_thread(
+            run_with_dashboard_service,
+            lambda service: service.get_monthly_dashboard(user_id, year, month)
+        )
         
-        return {
+        return ORJSONResponse({
             "status": "success",
             "data": dashboard_data
-        }
+        })
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Monthly dashboard error: {e}")
+        logger.exception("Monthly dashboard error")
         raise HTTPException(status_code=500, detail=f"Failed to get monthly dashboard: {str(e)}")
 
 @router.post("/goals/{user_id}")
 def set_user_goals(
     user_id: int,
     goals: GoalsRequest,
-    db: Session = Depends(get_db)
+    dashboard_service: DashboardService = Depends(get_dashboard_service)
 ):
     """Set daily nutrition goals for a user"""
     try:
-        dashboard_service = DashboardService(db)
-        
         goals_dict = {
             "calories": goals.calories,
             "protein": goals.protein,
@@ -131,45 +159,47 @@ def set_user_goals(
             "goals": goals_dict
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Set goals error: {e}")
+        logger.exception("Set goals error")
         raise HTTPException(status_code=500, detail=f"Failed to set goals: {str(e)}")
 
 @router.get("/history/{user_id}")
-def get_meal_history_with_calendar(
+async def get_meal_history_with_calendar(
     user_id: int,
-    days: Optional[int] = 30,
-    db: Session = Depends(get_db)
+    days: Optional[int] = 30
 ):
     """Get meal history with calendar information"""
     try:
-        dashboard_service = DashboardService(db)
-        
         # Validate days parameter
         if days < 1 or days > 365:
             raise HTTPException(status_code=400, detail="Days must be between 1 and 365")
         
-        meal_history = dashboard_service.get_meal_history_with_calendar(user_id, days)
+        meal_history = await asyncio.to_thread(
+            run_with_dashboard_service,
+            lambda service: service.get_meal_history_with_calendar(user_id, days)
+        )
         
-        return {
+        return ORJSONResponse({
             "status": "success",
-            "data": meal_history,
+            "data": without_none(meal_history),
             "total_meals": len(meal_history)
-        }
+        })
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Meal history error: {e}")
+        logger.exception("Meal history error")
         raise HTTPException(status_code=500, detail=f"Failed to get meal history: {str(e)}")
 
 @router.post("/sync_meal_calendar/{meal_id}")
 def sync_meal_calendar(
     meal_id: int,
-    db: Session = Depends(get_db)
+    dashboard_service: DashboardService = Depends(get_dashboard_service)
 ):
     """Manually sync meal with calendar information"""
     try:
-        dashboard_service = DashboardService(db)
-        
         success = dashboard_service.update_meal_calendar_info(meal_id)
         
         if not success:
@@ -180,27 +210,24 @@ def sync_meal_calendar(
             "message": "Meal calendar information updated successfully"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Sync meal calendar error: {e}")
+        logger.exception("Sync meal calendar error")
         raise HTTPException(status_code=500, detail=f"Failed to sync meal calendar: {str(e)}")
 
 @router.post("/update_daily_summary/{user_id}")
 def update_daily_summary(
     user_id: int,
     target_date: Optional[str] = None,
-    db: Session = Depends(get_db)
+    dashboard_service: DashboardService = Depends(get_dashboard_service)
 ):
     """Manually update daily summary for a user"""
     try:
-        dashboard_service = DashboardService(db)
-        
         # Parse date if provided
         parsed_date = None
         if target_date:
-            try:
-                parsed_date = date.fromisoformat(target_date)
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+            parsed_date = parse_iso_date(target_date)
         
         summary_data = dashboard_service.create_or_update_daily_summary(user_id, parsed_date)
         
@@ -213,6 +240,8 @@ def update_daily_summary(
             "data": summary_data
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Update daily summary error: {e}")
+        logger.exception("Update daily summary error")
         raise HTTPException(status_code=500, detail=f"Failed to update daily summary: {str(e)}")
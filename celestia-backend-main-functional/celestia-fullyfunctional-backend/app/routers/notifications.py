@@ -1,25 +1,56 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from sqlalchemy.orm import Session, load_only
 from typing import Dict, Any, List, Optional
 from pydantic import BaseModel, validator
+import logging
 import re
+import secrets
+from types import MappingProxyType
 
 from app.database import get_db
 from app.models.db_models import User
+from app.responses import ORJSONResponse, without_none
 from app.services.notification_service import NotificationService
 from app.services.pdf_report_service import PDFReportService
 from app.services.scheduler_service import get_scheduler
-from app.services.user_service import get_user
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
+logger = logging.getLogger(__name__)
+
+REPORT_DAYS_BACK = MappingProxyType({
+    "weekly": 7,
+    "monthly": 30,
+    "quarterly": 90
+})
+
+_PHONE_CLEAN_RE = re.compile(r'[\s\-\(\)]')
+_PHONE_INTL_RE = re.compile(r'^\+[1-9]\d{1,14}$')
+
+DEFAULT_NOTIFICATION_PREFERENCES = MappingProxyType({
+    "whatsapp_enabled": True,
+    "email_enabled": True,
+    "reminder_frequency": 5,
+    "daily_summary": True,
+    "weekly_summary": True,
+    "monthly_summary": True,
+    "quiet_hours_start": 22,
+    "quiet_hours_end": 7
+})
+
 # Simple authentication dependency - replace with proper JWT auth in production
 def get_current_user(user_id: int = 1, db: Session = Depends(get_db)) -> User:
     """
     Simple user authentication - replace with proper JWT authentication in production
     For now, defaults to user_id=1 for testing
     """
-    user = get_user(db, user_id)
+    # Notification routes only read these columns; skip profile/goals JSON and OTP fields
+    user = db.query(User).options(
+        load_only(
+            User.id, User.email, User.phone_number,
+            User.phone_verified, User.notification_preferences
+        )
+    ).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -27,6 +58,15 @@ def get_current_user(user_id: int = 1, db: Session = Depends(get_db)) -> User:
         )
     return user
 
+def require_user_exists(user_id: int = 1, db: Session = Depends(get_db)) -> int:
+    """Existence-only variant of get_current_user for routes that just need the id"""
+    if not db.query(db.query(User).filter(User.id == user_id).exists()).scalar():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    return user_id
+
 # Pydantic models for request/response
 class PhoneVerificationRequest(BaseModel):
     phone_number: str
@@ -34,10 +74,10 @@ class PhoneVerificationRequest(BaseModel):
     @validator('phone_number')
     def validate_phone_number(cls, v):
         # Remove any spaces, dashes, or parentheses
-        cleaned = re.sub(r'[\s\-\(\)]', '', v)
+        cleaned = _PHONE_CLEAN_RE.sub('', v)
         
         # Check if it's a valid international format
-        if not re.match(r'^\+[1-9]\d{1,14}$', cleaned):
+        if not _PHONE_INTL_RE.match(cleaned):
             raise ValueError('Phone number must be in international format (e.g., +919876543210)')
         
         return cleaned
@@ -47,7 +87,8 @@ class OTPVerificationRequest(BaseModel):
     
     @validator('otp')
     def validate_otp(cls, v):
-        if not re.match(r'^\d{6}$', v):
+        # Plain ASCII digits only; str.isdigit() alone also accepts other scripts
+        if not (len(v) == 6 and v.isascii() and v.isdigit()):
             raise ValueError('OTP must be exactly 6 digits')
         return v
 
@@ -92,20 +133,16 @@ class PDFExportRequest(BaseModel):
 @router.post("/phone/send-otp")
 async def send_phone_verification_otp(
     request: PhoneVerificationRequest,
-    current_user: User = Depends(get_current_user),
+    user_id: int = Depends(require_user_exists),
     db: Session = Depends(get_db)
 ):
     """Send OTP for phone number verification"""
     try:
         notification_service = NotificationService(db)
         
-        # Update user's phone number
-        current_user.phone_number = request.phone_number
-        db.commit()
-        
-        # Send OTP
+        # Saves the phone number together with the OTP, then sends it
         result = notification_service.send_phone_verification_otp(
-            user_id=current_user.id,
+            user_id=user_id,
             phone_number=request.phone_number
         )
         
@@ -121,7 +158,10 @@ async def send_phone_verification_otp(
                 detail=result.get("error", "Failed to send OTP")
             )
             
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("Error sending OTP")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error sending OTP: {str(e)}"
@@ -130,7 +170,7 @@ async def send_phone_verification_otp(
 @router.post("/phone/verify-otp")
 async def verify_phone_otp(
     request: OTPVerificationRequest,
-    current_user: User = Depends(get_current_user),
+    user_id: int = Depends(require_user_exists),
     db: Session = Depends(get_db)
 ):
     """Verify OTP and mark phone as verified"""
@@ -138,7 +178,7 @@ async def verify_phone_otp(
         notification_service = NotificationService(db)
         
         result = notification_service.verify_phone_otp(
-            user_id=current_user.id,
+            user_id=user_id,
             otp=request.otp
         )
         
@@ -154,7 +194,10 @@ async def verify_phone_otp(
                 detail=result.get("error", "Invalid or expired OTP")
             )
             
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("Error verifying OTP")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error verifying OTP: {str(e)}"
@@ -176,24 +219,8 @@ async def get_notification_preferences(
     current_user: User = Depends(get_current_user)
 ):
     """Get user's notification preferences"""
-    preferences = current_user.notification_preferences or {}
-    
-    # Ensure all default values are present
-    default_preferences = {
-        "whatsapp_enabled": True,
-        "email_enabled": True,
-        "reminder_frequency": 5,
-        "daily_summary": True,
-        "weekly_summary": True,
-        "monthly_summary": True,
-        "quiet_hours_start": 22,
-        "quiet_hours_end": 7
-    }
-    
-    # Merge with defaults
-    for key, default_value in default_preferences.items():
-        if key not in preferences:
-            preferences[key] = default_value
+    # Stored values win; missing keys fall back to the defaults
+    preferences = {**DEFAULT_NOTIFICATION_PREFERENCES, **(current_user.notification_preferences or {})}
     
     return {
         "preferences": preferences,
@@ -204,19 +231,15 @@ async def get_notification_preferences(
 @router.put("/preferences")
 async def update_notification_preferences(
     request: NotificationPreferencesRequest,
-    current_user: User = Depends(get_current_user),
+    user_id: int = Depends(require_user_exists),
     db: Session = Depends(get_db)
 ):
     """Update user's notification preferences"""
     try:
         notification_service = NotificationService(db)
         
-        # Build preferences update dict
-        preferences_update = {}
-        
-        for field, value in request.dict(exclude_unset=True).items():
-            if value is not None:
-                preferences_update[field] = value
+        # Only fields the client actually sent with a value
+        preferences_update = request.model_dump(exclude_unset=True, exclude_none=True)
         
         if not preferences_update:
             raise HTTPException(
@@ -225,7 +248,7 @@ async def update_notification_preferences(
             )
         
         result = notification_service.update_notification_preferences(
-            user_id=current_user.id,
+            user_id=user_id,
             preferences=preferences_update
         )
         
@@ -241,7 +264,10 @@ async def update_notification_preferences(
                 detail=result.get("error", "Failed to update preferences")
             )
             
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("Error updating preferences")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error updating preferences: {str(e)}"
@@ -250,24 +276,28 @@ async def update_notification_preferences(
 @router.get("/history")
 async def get_notification_history(
     limit: int = 50,
-    current_user: User = Depends(get_current_user),
+    user_id: int = Depends(require_user_exists),
     db: Session = Depends(get_db)
 ):
     """Get user's notification history"""
     try:
         notification_service = NotificationService(db)
         
-        history = notification_service.get_notification_history(
-            user_id=current_user.id,
+        history, total_count = notification_service.get_notification_history(
+            user_id=user_id,
             limit=min(limit, 100)  # Cap at 100
         )
         
-        return {
-            "history": history,
-            "total_count": len(history)
-        }
+        # Rows are already plain JSON types, so skip FastAPI's jsonable_encoder walk
+        return ORJSONResponse({
+            "history": without_none(history),
+            "total_count": total_count
+        })
         
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("Error getting notification history")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error getting notification history: {str(e)}"
@@ -301,66 +331,58 @@ async def send_test_reminder(
                 detail=result.get("error", "Failed to send test reminder")
             )
             
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("Error sending test reminder")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error sending test reminder: {str(e)}"
         )
 
-@router.post("/export-pdf")
+def run_pdf_report_job(job_id: str, user_id: int, report_type: str):
+    """Background job: render the report and deliver it (the scheduler opens its own session)"""
+    result = get_scheduler().generate_and_send_report(user_id=user_id, report_type=report_type)
+    if not result.get("success"):
+        logger.error("PDF report job %s failed for user %s: %s", job_id, user_id, result.get("error"))
+
+@router.post("/export-pdf", status_code=status.HTTP_202_ACCEPTED)
 async def export_pdf_report(
     request: PDFExportRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    user_id: int = Depends(require_user_exists)
 ):
-    """Generate and send PDF report via WhatsApp and email"""
-    try:
-        # Determine days back
-        days_back = request.days_back
-        if days_back is None:
-            days_back = {
-                "weekly": 7,
-                "monthly": 30,
-                "quarterly": 90
-            }.get(request.report_type, 7)
-        
-        # Generate and send report
-        scheduler = get_scheduler()
-        result = scheduler.generate_and_send_report(
-            user_id=current_user.id,
-            report_type=request.report_type
-        )
-        
-        if result.get("success"):
-            return {
-                "success": True,
-                "message": f"PDF report generated and sent successfully",
-                "report_type": request.report_type,
-                "days_covered": days_back,
-                "delivery_results": result.get("results", [])
-            }
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=result.get("error", "Failed to generate or send PDF report")
-            )
-            
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error generating PDF report: {str(e)}"
-        )
+    """Queue PDF report generation; it is sent via WhatsApp and email when ready"""
+    days_back = request.days_back if request.days_back is not None else REPORT_DAYS_BACK.get(request.report_type, 7)
+    
+    # Rendering and delivery take seconds, so run them after the response is sent
+    job_id = secrets.token_hex(8)
+    background_tasks.add_task(
+        run_pdf_report_job,
+        job_id=job_id,
+        user_id=user_id,
+        report_type=request.report_type
+    )
+    
+    return {
+        "success": True,
+        "status": "queued",
+        "job_id": job_id,
+        "message": "PDF report is being generated and will be sent shortly",
+        "report_type": request.report_type,
+        "days_covered": days_back
+    }
 
 @router.post("/send-daily-summary")
 async def send_daily_summary_now(
-    current_user: User = Depends(get_current_user),
+    user_id: int = Depends(require_user_exists),
     db: Session = Depends(get_db)
 ):
     """Send daily summary immediately"""
     try:
         notification_service = NotificationService(db)
         
-        result = notification_service.send_daily_summary(current_user.id)
+        result = notification_service.send_daily_summary(user_id)
         
         if result.get("success"):
             return {
@@ -374,7 +396,10 @@ async def send_daily_summary_now(
                 detail=result.get("error", "Failed to send daily summary")
             )
             
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("Error sending daily summary")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error sending daily summary: {str(e)}"
@@ -382,14 +407,14 @@ async def send_daily_summary_now(
 
 @router.post("/send-weekly-summary")
 async def send_weekly_summary_now(
-    current_user: User = Depends(get_current_user),
+    user_id: int = Depends(require_user_exists),
     db: Session = Depends(get_db)
 ):
     """Send weekly summary immediately"""
     try:
         notification_service = NotificationService(db)
         
-        result = notification_service.send_weekly_summary(current_user.id)
+        result = notification_service.send_weekly_summary(user_id)
         
         if result.get("success"):
             return {
@@ -403,7 +428,10 @@ async def send_weekly_summary_now(
                 detail=result.get("error", "Failed to send weekly summary")
             )
             
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("Error sending weekly summary")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error sending weekly summary: {str(e)}"
@@ -411,7 +439,7 @@ async def send_weekly_summary_now(
 
 @router.get("/scheduler/status")
 async def get_scheduler_status(
-    current_user: User = Depends(get_current_user)
+    user_id: int = Depends(require_user_exists)
 ):
     """Get scheduler service status (admin-like info for users)"""
     try:
@@ -427,7 +455,10 @@ async def get_scheduler_status(
             "service_status": status.get("status", "unknown")
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("Error getting scheduler status")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error getting scheduler status: {str(e)}"
@@ -441,45 +472,58 @@ async def get_user_notification_stats(
     """Get user's notification statistics"""
     try:
         from datetime import datetime, timedelta
+        from sqlalchemy import func
         from app.models.db_models import NotificationLog
         
         # Get notification counts by type for last 30 days
         cutoff_date = datetime.now() - timedelta(days=30)
         
-        notifications = db.query(NotificationLog).filter(
+        # Count in the database; only (type, status, count) rows come back
+        counts = db.query(
+            NotificationLog.notification_type,
+            NotificationLog.status,
+            func.count().label("n")
+        ).filter(
             NotificationLog.user_id == current_user.id,
             NotificationLog.created_at >= cutoff_date
+        ).group_by(
+            NotificationLog.notification_type,
+            NotificationLog.status
         ).all()
         
         # Group by type
         stats_by_type = {}
+        total_notifications = 0
         total_sent = 0
         total_failed = 0
         
-        for notif in notifications:
-            notif_type = notif.notification_type
+        for notif_type, notif_status, n in counts:
+            total_notifications += n
             if notif_type not in stats_by_type:
                 stats_by_type[notif_type] = {"sent": 0, "failed": 0}
             
-            if notif.status == "sent":
-                stats_by_type[notif_type]["sent"] += 1
-                total_sent += 1
-            elif notif.status == "failed":
-                stats_by_type[notif_type]["failed"] += 1
-                total_failed += 1
+            if notif_status == "sent":
+                stats_by_type[notif_type]["sent"] += n
+                total_sent += n
+            elif notif_status == "failed":
+                stats_by_type[notif_type]["failed"] += n
+                total_failed += n
         
         return {
             "period": "Last 30 days",
-            "total_notifications": len(notifications),
+            "total_notifications": total_notifications,
             "total_sent": total_sent,
             "total_failed": total_failed,
-            "success_rate": round((total_sent / len(notifications)) * 100, 1) if notifications else 0,
+            "success_rate": round((total_sent / total_notifications) * 100, 1) if total_notifications else 0,
             "by_type": stats_by_type,
             "phone_verified": current_user.phone_verified,
             "email_available": current_user.email is not None
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("Error getting notification stats")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error getting notification stats: {str(e)}"
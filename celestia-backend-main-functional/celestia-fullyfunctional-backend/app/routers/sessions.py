@@ -1,35 +1,40 @@
 from fastapi import APIRouter, HTTPException
-from typing import Dict
-import uuid
+from app.services.session_store import create_session_store, public_session_data
+import secrets
 
 router = APIRouter()
 
-sessions: Dict[str, Dict] = {}
+sessions = create_session_store()
 
 @router.post("/", response_model=dict)
 def create_session():
-    session_id = str(uuid.uuid4())
+    # Opaque 128-bit key straight from os.urandom
+    session_id = secrets.token_hex(16)
     sessions[session_id] = {
         "step": "upload",
-        "image": None,
+        "image_path": None,
         "analysis_data": None,
         "questions": [],
         "user_answers": [],
         "portion_estimates": None,
         "nutrition_summary": None,
-        "recommendations": None
+        "recommendations": None,
+        "explanation": None
     }
     return {"session_id": session_id}
 
 @router.delete("/{session_id}")
 def delete_session(session_id: str):
-    if session_id in sessions:
+    try:
         del sessions[session_id]
-        return {"message": "Session deleted"}
-    raise HTTPException(status_code=404, detail="Session not found")
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"message": "Session deleted"}
 
 @router.get("/{session_id}")
 def get_session(session_id: str):
-    if session_id not in sessions:
+    try:
+        session = sessions[session_id]
+    except KeyError:
         raise HTTPException(status_code=404, detail="Session not found")
-    return {"session_id": session_id, "data": sessions[session_id]}
\ No newline at end of file
+    return {"session_id": session_id, "data": public_session_data(session)}
\ No newline at end of file
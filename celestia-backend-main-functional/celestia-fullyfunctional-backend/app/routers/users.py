@@ -6,9 +6,12 @@ from app.models.pydantic_models import UserCreate, User, MealLog
 from app.models.google_models import GoogleUserCreate
 from app.models.db_models import User as DBUser
 from typing import Dict, Any, List
+import logging
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
 @router.post("/", response_model=User)
 def create_new_user(user: UserCreate, db: Session = Depends(get_db)):
     try:
@@ -20,7 +23,7 @@ def create_new_user(user: UserCreate, db: Session = Depends(get_db)):
 @router.post("/google", response_model=User)
 def create_or_login_google_user(user_data: GoogleUserCreate, db: Session = Depends(get_db)):
     try:
-        print(f"Received Google user data: {user_data}")
+        logger.info("Received Google user data: %s", user_data)
         
         # Validate required fields
         if not user_data.google_id or not user_data.email:
@@ -34,7 +37,7 @@ def create_or_login_google_user(user_data: GoogleUserCreate, db: Session = Depen
             db_user.name = user_data.name or db_user.name
             db_user.email = user_data.email or db_user.email
             db_user.picture = user_data.picture or db_user.picture
-            print(f"Updated existing user: {db_user.id}")
+            logger.info("Updated existing user: %s", db_user.id)
         else:
             # Create new user
             db_user = DBUser(
@@ -46,18 +49,18 @@ def create_or_login_google_user(user_data: GoogleUserCreate, db: Session = Depen
                 daily_goals={}
             )
             db.add(db_user)
-            print(f"Created new user for Google ID: {user_data.google_id}")
+            logger.info("Created new user for Google ID: %s", user_data.google_id)
         
         db.commit()
         db.refresh(db_user)
-        print(f"Successfully processed user: {db_user.id}")
+        logger.info("Successfully processed user: %s", db_user.id)
         return db_user
     except HTTPException:
         db.rollback()
         raise
     except Exception as e:
         db.rollback()
-        print(f"Google authentication error: {str(e)}")
+        logger.exception("Google authentication error")
         raise HTTPException(status_code=400, detail=f"Google authentication failed: {str(e)}")
 
 @router.get("/{user_id}", response_model=User)
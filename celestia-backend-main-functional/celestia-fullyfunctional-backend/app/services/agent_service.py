@@ -1,18 +1,26 @@
+import asyncio
 import json
+import threading
 from typing import Dict, Any, List, Optional
-import google.generativeai as genai
+from app.services.gemini_client import gemini_model as agent_model, generate_content_async
+from cachetools import TTLCache
 from sqlalchemy.orm import Session
-from app.config import settings
 from app.services.user_service import get_meal_history, get_user
 from datetime import datetime, timedelta
 
-genai.configure(api_key=settings.google_api_key)
-agent_model = genai.GenerativeModel("models/gemini-2.0-flash")
+
+# User context is shared across agent instances; entries are dropped when a meal is logged
+_user_context_cache = TTLCache(maxsize=1024, ttl=60)
+_user_context_lock = threading.Lock()
+
+def invalidate_user_context(user_id: int):
+    """Drop the cached context for a user after their data changes"""
+    with _user_context_lock:
+        _user_context_cache.pop(user_id, None)
 
 class HealthCoachAgent:
-    def __init__(self, db: Session = None):
-        self.db = db
-        self.system_prompt = """
+    # Prompt scaffolding is static, so it is built once per process rather than per agent
+    system_prompt = """
         You are an AI Health Coach specializing in Indian nutrition and wellness. Your responses should be:
         
         RESPONSE STYLE:
@@ -47,18 +55,28 @@ class HealthCoachAgent:
         Example bad response: Long paragraphs explaining protein science, multiple suggestions, medical terminology.
         """
     
-    def get_user_context(self, user_id: int) -> Dict[str, Any]:
+    def __init__(self, db: Session = None):
+        # Default session; methods also accept a per-call session so one agent can be shared
+        self.db = db
+    
+    def get_user_context(self, user_id: int, db: Optional[Session] = None) -> Dict[str, Any]:
         """Retrieve user's profile and recent meal history with calendar data"""
-        if not self.db or not user_id:
+        db = db or self.db
+        if not db or not user_id:
             return {}
         
-        user = get_user(self.db, user_id)
+        with _user_context_lock:
+            cached = _user_context_cache.get(user_id)
+        if cached is not None:
+            return cached
+        
+        user = get_user(db, user_id)
         if not user:
             return {}
         
         # Get meal history with calendar information
         from app.services.dashboard_service import DashboardService
-        dashboard_service = DashboardService(self.db)
+        dashboard_service = DashboardService(db)
         
         # Get recent meals with calendar data
         meal_history = dashboard_service.get_meal_history_with_calendar(user_id, 30)
@@ -67,13 +85,13 @@ class HealthCoachAgent:
         today_data = dashboard_service.get_daily_dashboard(user_id)
         
         # Calculate weekly stats
-        meals = get_meal_history(self.db, user_id)
+        meals = get_meal_history(db, user_id)
         weekly_stats = self.calculate_weekly_stats(meals[:7])
         
         # Add calendar-aware insights
         calendar_insights = self.get_calendar_insights(meal_history)
         
-        return {
+        context = {
             "profile": user.profile,
             "daily_goals": user.daily_goals or {},
             "recent_meals": len(meal_history),
@@ -85,6 +103,10 @@ class HealthCoachAgent:
             "diet_preference": user.profile.get("diet_preference", "none"),
             "meal_history": meal_history[:10]  # Last 10 meals for context
         }
+        
+        with _user_context_lock:
+            _user_context_cache[user_id] = context
+        return context
     
     def calculate_weekly_stats(self, meals: List) -> Dict[str, Any]:
         """Calculate nutritional statistics from meal history"""
@@ -263,18 +285,20 @@ class HealthCoachAgent:
         
         return suggestions
     
-    async def chat(self, message: str, context: Dict[str, Any]) -> str:
+    async def chat(self, message: str, context: Dict[str, Any], db: Optional[Session] = None) -> str:
         """Main chat function for the AI agent with meal memory capabilities"""
+        db = db or self.db
         try:
             # Build context-aware prompt
             user_context = {}
             meal_memory_result = None
             
-            if context.get("user_id") and self.db:
-                user_context = self.get_user_context(context["user_id"])
+            if context.get("user_id") and db:
+                # Synchronous DB reads; run them on a worker thread, one after the other on this request's session
+                user_context = await asyncio.to_thread(self.get_user_context, context["user_id"], db)
                 
                 # Check if this is a meal memory query
-                meal_memory_result = self.handle_meal_memory_query(context["user_id"], message)
+                meal_memory_result = await asyncio.to_thread(self.handle_meal_memory_query, context["user_id"], message, db)
             
             current_analysis = context.get("current_analysis", {})
             chat_history = context.get("chat_history", [])
@@ -318,8 +342,8 @@ class HealthCoachAgent:
             Include emojis sparingly to keep the tone friendly.
             """
             
-            # Generate response
-            response = agent_model.generate_content(prompt)
+            # Generate response without holding the event loop for the Gemini round-trip
+            response = await generate_content_async(prompt)
             
             # Add motivational message if appropriate
             if "goal" in message.lower() or "progress" in message.lower():
@@ -332,11 +356,11 @@ class HealthCoachAgent:
             print(f"Agent chat error: {e}")
             return "I'm having trouble processing that right now. Could you try rephrasing your question?"
     
-    def handle_meal_memory_query(self, user_id: int, message: str) -> Optional[Dict[str, Any]]:
+    def handle_meal_memory_query(self, user_id: int, message: str, db: Optional[Session] = None) -> Optional[Dict[str, Any]]:
         """Handle meal memory queries using the MealMemoryService"""
         try:
             from app.services.meal_memory_service import MealMemoryService
-            memory_service = MealMemoryService(self.db)
+            memory_service = MealMemoryService(db or self.db)
             
             # Check if this is a meal memory query
             query_keywords = ['when did i eat', 'what time', 'how often', 'last time', 'what did i eat with']
@@ -1,66 +1,32 @@
+import asyncio
 import io
 import json
 import re
+import threading
 from typing import Any, Dict, List, Optional, Union
 
-import google.generativeai as genai
+import orjson
+from cachetools import TTLCache
 from PIL import Image
 
-from app.config import settings
+from app.services.gemini_client import gemini_model
 
-genai.configure(api_key=settings.google_api_key)
-gemini_model = genai.GenerativeModel("models/gemini-2.0-flash")
+# Braces seen by the balanced-object fallback in clean_json_response
+_BRACE_RE = re.compile(r"[{}]")
 
-def clean_json_response(text: str) -> Optional[Dict[str, Any]]:
-    text = re.sub(r'```json', '', text)
-    text = re.sub(r'```', '', text)
-    text = text.strip()
-    brace_count = 0
-    start_idx = -1
-    end_idx = -1
-    for i, char in enumerate(text):
-        if char == '{':
-            if start_idx == -1:
-                start_idx = i
-            brace_count += 1
-        elif char == '}':
-            brace_count -= 1
-            if brace_count == 0 and start_idx != -1:
-                end_idx = i + 1
-                break
-    if start_idx != -1 and end_idx != -1:
-        json_text = text[start_idx:end_idx]
-        try:
-            return json.loads(json_text)
-        except Exception as e:
-            print(f"JSON parsing error: {e}")
-            return None
-    return None
+# Food recognition doesn't need more than this; larger images only cost upload time
+MAX_IMAGE_EDGE = 1024
 
-def create_fallback_response(error_msg: str) -> Dict[str, Any]:
-    return {
-        "items": [],
-        "total_calories": 0,
-        "total_protein": 0,
-        "total_carbs": 0,
-        "total_fat": 0,
-        "confidence_overall": 0,
-        "need_clarification": True,
-        "unclear_items": [f"Analysis failed: {error_msg}. Please try again."]
-    }
+# Repeat text queries ("2 idli with sambar") reuse the last good analysis instead of calling Gemini again.
+# Values are orjson bytes so every hit hands out a fresh dict the caller can mutate.
+_text_analysis_cache = TTLCache(maxsize=2048, ttl=24 * 60 * 60)
+_text_analysis_lock = threading.Lock()
 
-def analyze_food_image(image_or_text: Union[Image.Image, str], user_profile: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
-    """Analyze food from image or text description"""
-    if isinstance(image_or_text, str):
-        if not image_or_text.strip():
-            return create_fallback_response("Empty text provided")
-        dietary_context = ""
-        if user_profile and user_profile.get('diet_preference'):
-            dietary_context = f"Note: User prefers {user_profile['diet_preference']} food. "
-        prompt = f"""
+# Prompt templates are built once at import; only the placeholders are filled per call
+TEXT_ANALYSIS_PROMPT = """
         You are a food nutrition expert specializing in Indian cuisine and nutrition analysis. Analyze the following food items and provide nutrition information.
         {dietary_context}
-        Food items: {image_or_text}
+        Food items: {food}
         
         INDIAN CUISINE EXPERTISE:
         - Recognize traditional Indian dishes like idli, dosa, paratha, biryani, dal, sabzi, roti, chapati, samosa, etc.
@@ -96,16 +62,8 @@ def analyze_food_image(image_or_text: Union[Image.Image, str], user_profile: Opt
             "unclear_items": ["What is the exact quantity/serving size?", "How is this dish prepared (cooking oil, spices used)?", "Any specific regional variation or ingredients?"]
         }}
         """
-    else:
-        try:
-            if image_or_text.mode != 'RGB':
-                image_or_text = image_or_text.convert('RGB')
-        except Exception as e:
-            return create_fallback_response(f"Invalid image format: {str(e)}")
-        dietary_context = ""
-        if user_profile and user_profile.get('diet_preference'):
-            dietary_context = f"Note: User prefers {user_profile['diet_preference']} food. Please identify if items are vegetarian/non-vegetarian. "
-        prompt = f"""
+
+IMAGE_ANALYSIS_PROMPT = """
         You are a food nutrition expert specializing in Indian cuisine and nutrition analysis. Analyze this food image and provide detailed nutrition information.
         {dietary_context}
         
@@ -144,48 +102,10 @@ def analyze_food_image(image_or_text: Union[Image.Image, str], user_profile: Opt
             "unclear_items": ["What is the exact serving size?", "How was this prepared (oil type, cooking method)?", "Any specific regional variation or accompaniments?"]
         }}
         """
-    
-    try:
-        if isinstance(image_or_text, str):
-            response = gemini_model.generate_content([prompt])
-        else:
-            response = gemini_model.generate_content([prompt, image_or_text])
-        
-        result = clean_json_response(response.text)
-        
-        if not result:
-            return create_fallback_response("JSON parsing failed")
-        
-        # Force clarification if not set
-        if not result.get('need_clarification', False):
-            result['need_clarification'] = True
-            if not result.get('unclear_items'):
-                result['unclear_items'] = ["Can you confirm the serving size?", "Any dietary restrictions to consider?"]
-        
-        return result
-        
-    except Exception as e:
-        print(f"Analysis error: {e}")
-        return create_fallback_response(f"Analysis service error: {str(e)}")
 
-def generate_clarifying_questions(analysis_data: Dict[str, Any]) -> List[str]:
-    unclear_items = analysis_data.get('unclear_items', [])
-    if not unclear_items:
-        return ["Can you provide more details about the food items?"]
-    questions = []
-    for item in unclear_items[:3]:
-        if not item.endswith('?'):
-            item += '?'
-        questions.append(item)
-    return questions
-
-def refine_analysis_with_answers(original_data: Dict[str, Any], questions: List[str], answers: List[str]) -> Optional[Dict[str, Any]]:
-    qa_text = ""
-    for q, a in zip(questions, answers):
-        qa_text += f"Q: {q}\nA: {a}\n"
-    prompt = f"""
+REFINE_PROMPT = """
     Update the food analysis based on user clarifications.
-    Original analysis: {json.dumps(original_data, indent=2)}
+    Original analysis: {original_data}
     User clarifications:
     {qa_text}
     Provide updated analysis in this EXACT JSON format:
@@ -210,6 +130,158 @@ def refine_analysis_with_answers(original_data: Dict[str, Any], questions: List[
         "unclear_items": []
     }}
     """
+
+EXPLANATION_PROMPT = """
+    Provide nutrition insights for this food analysis:
+    {analysis_data}
+    Create a detailed explanation with:
+    ## Key Highlights
+    ## Health Benefits
+    ## Areas for Improvement
+    ## Recommendations
+    Make it informative and actionable.
+    """
+
+def clean_json_response(text: str) -> Optional[Dict[str, Any]]:
+    text = text.replace('```json', '').replace('```', '').strip()
+    start_idx = text.find('{')
+    if start_idx == -1:
+        return None
+    # Replies are normally just the object, so try the outermost braces first
+    last_idx = text.rfind('}')
+    if last_idx > start_idx:
+        try:
+            return orjson.loads(text[start_idx:last_idx + 1])
+        except orjson.JSONDecodeError:
+            pass
+    # Extra text after the object: fall back to the first balanced {...}
+    brace_count = 0
+    end_idx = -1
+    # Jump between braces instead of stepping through every character in Python
+    for match in _BRACE_RE.finditer(text, start_idx):
+        if match.group() == '{':
+            brace_count += 1
+        else:
+            brace_count -= 1
+            if brace_count == 0:
+                end_idx = match.end()
+                break
+    if end_idx != -1:
+        json_text = text[start_idx:end_idx]
+        try:
+            return json.loads(json_text)
+        except Exception as e:
+            print(f"JSON parsing error: {e}")
+            return None
+    return None
+
+def image_part(image: Union[Image.Image, bytes]) -> Dict[str, Any]:
+    """JPEG part for Gemini, longest edge capped at MAX_IMAGE_EDGE.
+
+    Bytes are taken to be an upload already downscaled and encoded by the
+    analysis router. PIL images are re-encoded here, because the SDK would
+    otherwise send them as lossless WebP.
+    """
+    if isinstance(image, bytes):
+        return {"mime_type": "image/jpeg", "data": image}
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    if max(image.size) > MAX_IMAGE_EDGE:
+        image = image.copy()
+        image.thumbnail((MAX_IMAGE_EDGE, MAX_IMAGE_EDGE), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85, optimize=True)
+    return {"mime_type": "image/jpeg", "data": buffer.getvalue()}
+
+def create_fallback_response(error_msg: str) -> Dict[str, Any]:
+    return {
+        "items": [],
+        "total_calories": 0,
+        "total_protein": 0,
+        "total_carbs": 0,
+        "total_fat": 0,
+        "confidence_overall": 0,
+        "need_clarification": True,
+        "unclear_items": [f"Analysis failed: {error_msg}. Please try again."]
+    }
+
+def analyze_food_image(image_or_text: Union[Image.Image, bytes, str], user_profile: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Analyze food from image or text description"""
+    cache_key = None
+    if isinstance(image_or_text, str):
+        if not image_or_text.strip():
+            return create_fallback_response("Empty text provided")
+        diet_preference = user_profile.get('diet_preference') if user_profile else None
+        cache_key = (" ".join(image_or_text.lower().split()), diet_preference)
+        with _text_analysis_lock:
+            cached = _text_analysis_cache.get(cache_key)
+        if cached is not None:
+            return orjson.loads(cached)
+        dietary_context = ""
+        if diet_preference:
+            dietary_context = f"Note: User prefers {diet_preference} food. "
+        prompt = TEXT_ANALYSIS_PROMPT.format(dietary_context=dietary_context, food=image_or_text)
+    else:
+        try:
+            image_or_text = image_part(image_or_text)
+        except Exception as e:
+            return create_fallback_response(f"Invalid image format: {str(e)}")
+        dietary_context = ""
+        if user_profile and user_profile.get('diet_preference'):
+            dietary_context = f"Note: User prefers {user_profile['diet_preference']} food. Please identify if items are vegetarian/non-vegetarian. "
+        prompt = IMAGE_ANALYSIS_PROMPT.format(dietary_context=dietary_context)
+    
+    try:
+        if isinstance(image_or_text, str):
+            response = gemini_model.generate_content([prompt])
+        else:
+            response = gemini_model.generate_content([prompt, image_or_text])
+        
+        result = clean_json_response(response.text)
+        
+        if not result:
+            return create_fallback_response("JSON parsing failed")
+        
+        # Force clarification if not set
+        if not result.get('need_clarification', False):
+            result['need_clarification'] = True
+            if not result.get('unclear_items'):
+                result['unclear_items'] = ["Can you confirm the serving size?", "Any dietary restrictions to consider?"]
+        
+        # Only cache real analyses; fallbacks return above. need_clarification is forced on for
+        # every result, so it can't be used to decide what to cache.
+        if cache_key is not None and result.get('items'):
+            with _text_analysis_lock:
+                _text_analysis_cache[cache_key] = orjson.dumps(result)
+        
+        return result
+        
+    except Exception as e:
+        print(f"Analysis error: {e}")
+        return create_fallback_response(f"Analysis service error: {str(e)}")
+
+async def analyze_food_image_async(image_or_text: Union[Image.Image, bytes, str], user_profile: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """analyze_food_image on a worker thread, so the blocking Gemini call never holds the event loop"""
+    return await asyncio.to_thread(analyze_food_image, image_or_text, user_profile)
+
+def generate_clarifying_questions(analysis_data: Dict[str, Any]) -> List[str]:
+    unclear_items = analysis_data.get('unclear_items') or []
+    return [
+        item if item.endswith('?') else item + '?'
+        for item in unclear_items[:3]
+    ] or ["Can you provide more details about the food items?"]
+
+def refine_analysis_with_answers(original_data: Dict[str, Any], questions: List[str], answers: List[str], bulk: bool = False) -> Optional[Dict[str, Any]]:
+    qa_text = ""
+    if bulk:
+        # One answer covers every question; send it once instead of repeating it per question
+        for q in questions:
+            qa_text += f"Q: {q}\n"
+        qa_text += f"A (applies to all questions above): {answers[0]}\n"
+    else:
+        for q, a in zip(questions, answers):
+            qa_text += f"Q: {q}\nA: {a}\n"
+    prompt = REFINE_PROMPT.format(original_data=json.dumps(original_data, indent=2), qa_text=qa_text)
     try:
         response = gemini_model.generate_content([prompt])
         result = clean_json_response(response.text)
@@ -229,16 +301,7 @@ def portion_estimation(analysis_data: Dict[str, Any]) -> Dict[str, Any]:
     return estimates
 
 def explainability(analysis_data: Dict[str, Any]) -> str:
-    prompt = f"""
-    Provide nutrition insights for this food analysis:
-    {json.dumps(analysis_data, indent=2)}
-    Create a detailed explanation with:
-    ## Key Highlights
-    ## Health Benefits
-    ## Areas for Improvement
-    ## Recommendations
-    Make it informative and actionable.
-    """
+    prompt = EXPLANATION_PROMPT.format(analysis_data=json.dumps(analysis_data, indent=2))
     try:
         response = gemini_model.generate_content(prompt)
         return response.text
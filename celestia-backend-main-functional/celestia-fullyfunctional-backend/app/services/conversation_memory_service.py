@@ -1,16 +1,89 @@
+from collections import Counter
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, and_, or_
+from sqlalchemy import desc, and_, or_, cast, case, distinct, func, select, true, String
 from app.models.agentic_models import ConversationMemory
-import json
+from cachetools import TTLCache
+import re
+import threading
 import uuid
 
+# Flattened, lowercased context_data text per stored memory; context never changes after insert
+_context_text_cache = TTLCache(maxsize=8192, ttl=60 * 60)
+_context_text_lock = threading.Lock()
+
+# Topics counted in the conversation summary
+SUMMARY_TOPIC_KEYWORDS = ['nutrition', 'calories', 'protein', 'exercise', 'weight', 'health', 'diet']
+
+# Keyword groups that raise a message's importance, and how much each group adds
+IMPORTANCE_KEYWORD_GROUPS = {
+    'goal': (0.3, ['goal', 'target', 'want to', 'trying to', 'plan to']),
+    'health': (0.3, ['problem', 'issue', 'concern', 'worried', 'help']),
+    'restriction': (0.4, ['allergic', 'vegetarian', 'vegan', 'avoid', 'cannot eat']),
+}
+_KEYWORD_GROUP = {
+    keyword: group
+    for group, (_, keywords) in IMPORTANCE_KEYWORD_GROUPS.items()
+    for keyword in keywords
+}
+def escape_like(term: str) -> str:
+    """Escape LIKE wildcards so search terms match literally"""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _flatten_lower(obj):
+    """Yield lowercased keys and scalar leaves of a JSON-like value"""
+    if isinstance(obj, str):
+        yield obj.lower()
+    elif isinstance(obj, dict):
+        for key, value in obj.items():
+            yield str(key).lower()
+            yield from _flatten_lower(value)
+    elif isinstance(obj, (list, tuple)):
+        for value in obj:
+            yield from _flatten_lower(value)
+    elif obj is not None:
+        yield str(obj).lower()
+
+def memory_context_text(memory: ConversationMemory) -> str:
+    """Lowercased text of a memory's context, one leaf per line, built once per memory"""
+    if not memory.context_data:
+        return ""
+    key = (memory.id, memory.created_at)
+    with _context_text_lock:
+        text = _context_text_cache.get(key)
+    if text is None:
+        text = "\n".join(_flatten_lower(memory.context_data))
+        with _context_text_lock:
+            _context_text_cache[key] = text
+    return text
+
+def keyword_pattern(keywords) -> Optional[re.Pattern]:
+    """Compile keywords into one scan; the lookahead keeps overlapping keywords visible"""
+    # Longest first, so a keyword that prefixes another is recovered in matched_keywords
+    keywords = sorted({keyword for keyword in keywords if keyword}, key=len, reverse=True)
+    if not keywords:
+        return None
+    return re.compile("(?=(" + "|".join(re.escape(keyword) for keyword in keywords) + "))")
+
+def matched_keywords(pattern: re.Pattern, keywords, text: str) -> set:
+    """Keywords found in ``text``, same as testing ``keyword in text`` for each one"""
+    hits = {match.group(1) for match in pattern.finditer(text)}
+    # At each position only the longest keyword is captured; shorter ones starting there are its prefixes
+    return hits | {
+        keyword for keyword in keywords
+        if keyword and keyword not in hits and any(hit.startswith(keyword) for hit in hits)
+    }
+
+# One pass over the message finds every importance group
+_IMPORTANCE_KEYWORD_RE = keyword_pattern(_KEYWORD_GROUP)
+
 class ConversationMemoryService:
     def __init__(self, db: Session):
         self.db = db
         self.max_memory_per_session = 50  # Maximum messages to keep per session
         self.memory_retention_days = 30  # Days to keep conversation memory
+        self.cleanup_every_n_messages = 10  # Run retention cleanup on every Nth stored message
     
     def create_session_id(self) -> str:
         """Generate a unique session ID"""
@@ -39,12 +112,20 @@ class ConversationMemoryService:
             )
             
             self.db.add(memory)
-            self.db.commit()
-            self.db.refresh(memory)
+            # Flush so the session count below includes this message; insert and cleanup share one commit
+            self.db.flush()
             
-            # Clean up old memories to maintain performance
-            self._cleanup_old_memories(user_id, session_id)
+            # Clean up old memories to maintain performance, every few messages of a session rather than on each one
+            session_count = self.db.query(func.count(ConversationMemory.id)).filter(
+                and_(
+                    ConversationMemory.user_id == user_id,
+                    ConversationMemory.session_id == session_id
+                )
+            ).scalar()
+            if session_count % self.cleanup_every_n_messages == 0:
+                self._cleanup_old_memories(user_id, session_id)
             
+            self.db.commit()
             return memory
             
         except Exception as e:
@@ -94,40 +175,55 @@ class ConversationMemoryService:
     ) -> List[Dict[str, Any]]:
         """Retrieve relevant conversation memories based on current context"""
         try:
-            # Get recent high-importance memories
-            base_query = self.db.query(ConversationMemory).filter(
-                ConversationMemory.user_id == user_id
-            )
-            
-            # Filter by recency and importance
+            # Recent, at least moderately important memories; plain rows, no ORM objects
             cutoff_date = datetime.now() - timedelta(days=self.memory_retention_days)
-            memories = base_query.filter(
-                and_(
+            rows = self.db.execute(
+                select(
+                    ConversationMemory.id,
+                    ConversationMemory.message_type,
+                    ConversationMemory.content,
+                    ConversationMemory.context_data,
+                    ConversationMemory.importance_score,
+                    ConversationMemory.created_at,
+                    ConversationMemory.session_id
+                ).where(
+                    ConversationMemory.user_id == user_id,
                     ConversationMemory.created_at >= cutoff_date,
-                    ConversationMemory.importance_score >= 0.3  # Only moderately important memories
-                )
-            ).order_by(
-                desc(ConversationMemory.importance_score),
-                desc(ConversationMemory.created_at)
-            ).limit(limit * 2).all()  # Get more to filter contextually
+                    ConversationMemory.importance_score >= 0.3
+                ).order_by(
+                    desc(ConversationMemory.importance_score),
+                    desc(ConversationMemory.created_at)
+                ).limit(limit * 2 if current_context else limit)  # Get more to filter contextually
+            ).all()
             
-            # If current context is provided, filter for relevance
-            if current_context:
-                relevant_memories = self._filter_by_context_relevance(memories, current_context)
-                return relevant_memories[:limit]
+            if not current_context:
+                return [self._memory_dict(row) for row in rows]
             
-            return [
-                {
-                    'id': memory.id,
-                    'message_type': memory.message_type,
-                    'content': memory.content,
-                    'context_data': memory.context_data,
-                    'importance_score': memory.importance_score,
-                    'created_at': memory.created_at.isoformat(),
-                    'session_id': memory.session_id
-                }
-                for memory in memories[:limit]
-            ]
+            # Score relevance to the current context in the same pass that builds the output
+            current_keywords = self._context_keywords(current_context)
+            keyword_re = keyword_pattern(current_keywords)
+            relevant_memories = []
+            
+            for row in rows:
+                relevance_score = 0
+                if keyword_re:
+                    relevance_score = (
+                        2 * len(matched_keywords(keyword_re, current_keywords, row.content.lower()))
+                        + len(matched_keywords(keyword_re, current_keywords, memory_context_text(row)))
+                    )
+                
+                # Include if relevant or high importance
+                if relevance_score > 0 or row.importance_score >= 0.7:
+                    memory = self._memory_dict(row)
+                    memory['relevance_score'] = relevance_score
+                    relevant_memories.append(memory)
+            
+            # Sort by relevance and importance
+            relevant_memories.sort(
+                key=lambda x: (x['relevance_score'], x['importance_score']), 
+                reverse=True
+            )
+            return relevant_memories[:limit]
             
         except Exception as e:
             print(f"Error retrieving contextual memory: {e}")
@@ -143,23 +239,35 @@ class ConversationMemoryService:
         try:
             # Simple text search (can be enhanced with full-text search later)
             search_terms = search_query.lower().split()
+            if not search_terms:
+                return []
+            
+            # Let the database drop rows that match no term; only candidates are scored below
+            context_text = cast(ConversationMemory.context_data, String)
+            term_filters = []
+            for term in search_terms:
+                pattern = f"%{escape_like(term)}%"
+                term_filters.append(ConversationMemory.content.ilike(pattern, escape="\\"))
+                term_filters.append(context_text.ilike(pattern, escape="\\"))
             
             memories = self.db.query(ConversationMemory).filter(
-                ConversationMemory.user_id == user_id
+                ConversationMemory.user_id == user_id,
+                or_(*term_filters)
             ).order_by(desc(ConversationMemory.created_at)).all()
             
+            term_re = keyword_pattern(search_terms)
             matching_memories = []
             for memory in memories:
                 content_lower = memory.content.lower()
-                context_str = json.dumps(memory.context_data).lower()
+                context_str = memory_context_text(memory)
                 
-                # Check if any search term matches
-                relevance_score = 0
-                for term in search_terms:
-                    if term in content_lower:
-                        relevance_score += 2
-                    if term in context_str:
-                        relevance_score += 1
+                # Check which search terms match; repeated terms count each time, as before
+                content_hits = matched_keywords(term_re, search_terms, content_lower)
+                context_hits = matched_keywords(term_re, search_terms, context_str)
+                relevance_score = sum(
+                    2 * (term in content_hits) + (term in context_hits)
+                    for term in search_terms
+                )
                 
                 if relevance_score > 0:
                     matching_memories.append({
@@ -194,78 +302,94 @@ class ConversationMemoryService:
     def get_user_conversation_summary(self, user_id: int) -> Dict[str, Any]:
         """Get a summary of user's conversation patterns and preferences"""
         try:
-            # Get all memories for analysis
             cutoff_date = datetime.now() - timedelta(days=self.memory_retention_days)
-            memories = self.db.query(ConversationMemory).filter(
-                and_(
-                    ConversationMemory.user_id == user_id,
-                    ConversationMemory.created_at >= cutoff_date
-                )
-            ).all()
+            in_window = and_(
+                ConversationMemory.user_id == user_id,
+                ConversationMemory.created_at >= cutoff_date
+            )
             
-            if not memories:
+            # Counts, averages and topic frequencies come back from the database as one row
+            stats = self.db.query(
+                func.count(ConversationMemory.id).label('total'),
+                func.sum(case((ConversationMemory.message_type == 'user', 1), else_=0)).label('user_messages'),
+                func.sum(case((ConversationMemory.message_type == 'agent', 1), else_=0)).label('agent_messages'),
+                func.avg(ConversationMemory.importance_score).label('avg_importance'),
+                func.sum(case((ConversationMemory.importance_score >= 0.7, 1), else_=0)).label('high_importance'),
+                func.count(distinct(ConversationMemory.session_id)).label('unique_sessions'),
+                func.max(ConversationMemory.created_at).label('last_conversation'),
+                *[
+                    func.sum(case((ConversationMemory.content.ilike(f"%{keyword}%"), 1), else_=0)).label(keyword)
+                    for keyword in SUMMARY_TOPIC_KEYWORDS
+                ]
+            ).filter(in_window).one()
+            
+            total_messages = stats.total
+            if not total_messages:
                 return {'total_conversations': 0}
             
-            # Analyze conversation patterns
-            total_messages = len(memories)
-            user_messages = [m for m in memories if m.message_type == 'user']
-            agent_messages = [m for m in memories if m.message_type == 'agent']
-            
-            # Extract common topics from context data
-            topics = {}
-            food_mentions = set()
-            goal_mentions = set()
-            
-            for memory in memories:
-                context = memory.context_data
-                
-                # Extract topics from context
-                if context.get('current_analysis'):
-                    items = context['current_analysis'].get('items', [])
-                    for item in items:
-                        food_name = item.get('name', '').lower()
-                        if food_name:
-                            food_mentions.add(food_name)
-                
-                # Extract goals mentioned
-                if context.get('user_context', {}).get('goals'):
-                    for goal in context['user_context']['goals']:
-                        goal_mentions.add(goal.lower())
-                
-                # Count topic frequencies in content
-                content_lower = memory.content.lower()
-                topic_keywords = ['nutrition', 'calories', 'protein', 'exercise', 'weight', 'health', 'diet']
-                for keyword in topic_keywords:
-                    if keyword in content_lower:
-                        topics[keyword] = topics.get(keyword, 0) + 1
+            # Food and goal mentions live inside the context JSON; the database unnests and dedupes them
+            food_mentions = self._distinct_context_values(
+                in_window, ('current_analysis', 'items'), 'name', limit=10
+            )
+            goal_mentions = self._distinct_context_values(in_window, ('user_context', 'goals'))
             
-            # Calculate engagement metrics
-            avg_importance = sum(m.importance_score for m in memories) / len(memories)
-            high_importance_count = len([m for m in memories if m.importance_score >= 0.7])
+            topics = Counter({keyword: getattr(stats, keyword) for keyword in SUMMARY_TOPIC_KEYWORDS})
             
             # Get session statistics
-            unique_sessions = len(set(m.session_id for m in memories))
+            unique_sessions = stats.unique_sessions
             avg_messages_per_session = total_messages / unique_sessions if unique_sessions > 0 else 0
             
             return {
                 'total_conversations': total_messages,
-                'user_messages': len(user_messages),
-                'agent_messages': len(agent_messages),
+                'user_messages': stats.user_messages,
+                'agent_messages': stats.agent_messages,
                 'unique_sessions': unique_sessions,
                 'avg_messages_per_session': round(avg_messages_per_session, 1),
-                'avg_importance_score': round(avg_importance, 2),
-                'high_importance_conversations': high_importance_count,
-                'common_topics': dict(sorted(topics.items(), key=lambda x: x[1], reverse=True)[:5]),
-                'frequently_mentioned_foods': list(food_mentions)[:10],
-                'mentioned_goals': list(goal_mentions),
+                'avg_importance_score': round(stats.avg_importance, 2),
+                'high_importance_conversations': stats.high_importance,
+                'common_topics': {topic: count for topic, count in topics.most_common(5) if count},
+                'frequently_mentioned_foods': food_mentions,
+                'mentioned_goals': goal_mentions,
                 'conversation_period_days': self.memory_retention_days,
-                'last_conversation': memories[-1].created_at.isoformat() if memories else None
+                'last_conversation': stats.last_conversation.isoformat() if stats.last_conversation else None
             }
             
         except Exception as e:
             print(f"Error generating conversation summary: {e}")
             return {'error': str(e)}
     
+    def _distinct_context_values(
+        self,
+        criterion,
+        array_path: Tuple[str, ...],
+        field: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[str]:
+        """Distinct lowercased entries of a JSON array inside context_data, unnested in SQL"""
+        if self.db.get_bind().dialect.name == "postgresql":
+            # json_array_elements raises on scalars and objects; NULL instead unnests to no rows, like json_each
+            stored = ConversationMemory.context_data[array_path]
+            array = case((func.json_typeof(stored) == 'array', stored))
+            if field:
+                elements = func.json_array_elements(array).table_valued('value').lateral()
+                value = elements.c.value.op('->>')(field)
+            else:
+                elements = func.json_array_elements_text(array).table_valued('value').lateral()
+                value = elements.c.value
+            query = self.db.query(func.lower(value)).select_from(ConversationMemory).join(elements, true())
+        else:
+            # SQLite: json_each walks the array at the given path for each row
+            elements = func.json_each(ConversationMemory.context_data, '$.' + '.'.join(array_path)).table_valued('value', 'type')
+            value = func.json_extract(elements.c.value, f'$.{field}') if field else elements.c.value
+            query = self.db.query(func.lower(value)).select_from(ConversationMemory).join(elements, true()).filter(
+                elements.c.type == ('object' if field else 'text')
+            )
+        
+        query = query.filter(criterion, value.isnot(None), value != '').distinct()
+        if limit:
+            query = query.limit(limit)
+        return [mention for (mention,) in query]
+    
     def _calculate_importance_score(self, content: str, context_data: Dict[str, Any]) -> float:
         """Calculate importance score for a conversation message"""
         score = 0.0
@@ -278,20 +402,14 @@ class ConversationMemoryService:
         if '?' in content:
             score += 0.2
         
-        # Higher score for goal-related content
-        goal_keywords = ['goal', 'target', 'want to', 'trying to', 'plan to']
-        if any(keyword in content_lower for keyword in goal_keywords):
-            score += 0.3
-        
-        # Higher score for health concerns
-        health_keywords = ['problem', 'issue', 'concern', 'worried', 'help']
-        if any(keyword in content_lower for keyword in health_keywords):
-            score += 0.3
-        
-        # Higher score for specific food preferences or restrictions
-        restriction_keywords = ['allergic', 'vegetarian', 'vegan', 'avoid', 'cannot eat']
-        if any(keyword in content_lower for keyword in restriction_keywords):
-            score += 0.4
+        # Goal, health-concern and food-restriction keywords each count once per group
+        groups = {
+            _KEYWORD_GROUP[keyword]
+            for keyword in matched_keywords(_IMPORTANCE_KEYWORD_RE, _KEYWORD_GROUP, content_lower)
+        }
+        for group, (weight, _) in IMPORTANCE_KEYWORD_GROUPS.items():
+            if group in groups:
+                score += weight
         
         # Context-based scoring
         if context_data:
@@ -310,15 +428,8 @@ class ConversationMemoryService:
         # Cap the score at 1.0
         return min(score, 1.0)
     
-    def _filter_by_context_relevance(
-        self, 
-        memories: List[ConversationMemory], 
-        current_context: Dict[str, Any]
-    ) -> List[Dict[str, Any]]:
-        """Filter memories by relevance to current context"""
-        relevant_memories = []
-        
-        # Extract current context keywords
+    def _context_keywords(self, current_context: Dict[str, Any]) -> set:
+        """Lowercased words from the current meal's food names and the user's goals"""
         current_keywords = set()
         
         if current_context.get('current_analysis'):
@@ -331,85 +442,69 @@ class ConversationMemoryService:
             for goal in current_context['user_context']['goals']:
                 current_keywords.update(goal.lower().split())
         
-        for memory in memories:
-            relevance_score = 0
-            
-            # Check content relevance
-            memory_content = memory.content.lower()
-            memory_context = json.dumps(memory.context_data).lower()
-            
-            for keyword in current_keywords:
-                if keyword in memory_content:
-                    relevance_score += 2
-                if keyword in memory_context:
-                    relevance_score += 1
-            
-            # Include if relevant or high importance
-            if relevance_score > 0 or memory.importance_score >= 0.7:
-                relevant_memories.append({
-                    'id': memory.id,
-                    'message_type': memory.message_type,
-                    'content': memory.content,
-                    'context_data': memory.context_data,
-                    'importance_score': memory.importance_score,
-                    'created_at': memory.created_at.isoformat(),
-                    'session_id': memory.session_id,
-                    'relevance_score': relevance_score
-                })
-        
-        # Sort by relevance and importance
-        relevant_memories.sort(
-            key=lambda x: (x['relevance_score'], x['importance_score']), 
-            reverse=True
-        )
-        
-        return relevant_memories
+        return current_keywords
+    
+    def _memory_dict(self, memory) -> Dict[str, Any]:
+        """Response shape for a memory row"""
+        return {
+            'id': memory.id,
+            'message_type': memory.message_type,
+            'content': memory.content,
+            'context_data': memory.context_data,
+            'importance_score': memory.importance_score,
+            'created_at': memory.created_at.isoformat(),
+            'session_id': memory.session_id
+        }
     
     def _cleanup_old_memories(self, user_id: int, session_id: str):
-        """Clean up old memories to maintain performance"""
+        """Delete old memories in bulk; the caller commits.
+
+        Runs in a savepoint, so a failed cleanup is rolled back on its own and
+        never takes the caller's pending insert with it.
+        """
         try:
-            # Remove very old memories
-            cutoff_date = datetime.now() - timedelta(days=self.memory_retention_days)
-            old_memories = self.db.query(ConversationMemory).filter(
-                and_(
-                    ConversationMemory.user_id == user_id,
-                    ConversationMemory.created_at < cutoff_date
-                )
-            ).all()
-            
-            for memory in old_memories:
-                self.db.delete(memory)
-            
-            # Limit memories per session
-            session_memories = self.db.query(ConversationMemory).filter(
-                and_(
-                    ConversationMemory.user_id == user_id,
-                    ConversationMemory.session_id == session_id
-                )
-            ).order_by(desc(ConversationMemory.created_at)).all()
-            
-            if len(session_memories) > self.max_memory_per_session:
-                # Keep high importance memories and recent ones
-                to_keep = []
-                to_delete = []
-                
-                for memory in session_memories:
-                    if len(to_keep) < self.max_memory_per_session:
-                        if memory.importance_score >= 0.5 or len(to_keep) < self.max_memory_per_session // 2:
-                            to_keep.append(memory)
-                        else:
-                            to_delete.append(memory)
-                    else:
-                        to_delete.append(memory)
-                
-                for memory in to_delete:
-                    self.db.delete(memory)
-            
-            self.db.commit()
-            
+            with self.db.begin_nested():
+                self._delete_old_memories(user_id, session_id)
         except Exception as e:
             print(f"Error cleaning up memories: {e}")
-            self.db.rollback()
+    
+    def _delete_old_memories(self, user_id: int, session_id: str):
+        """Retention and per-session limit deletes behind _cleanup_old_memories"""
+        # Remove very old memories
+        cutoff_date = datetime.now() - timedelta(days=self.memory_retention_days)
+        self.db.query(ConversationMemory).filter(
+            and_(
+                ConversationMemory.user_id == user_id,
+                ConversationMemory.created_at < cutoff_date
+            )
+        ).delete(synchronize_session=False)
+        
+        # Limit memories per session; only ids and scores are needed to pick what stays
+        session_memories = self.db.query(
+            ConversationMemory.id, ConversationMemory.importance_score
+        ).filter(
+            and_(
+                ConversationMemory.user_id == user_id,
+                ConversationMemory.session_id == session_id
+            )
+        ).order_by(desc(ConversationMemory.created_at)).all()
+        
+        if len(session_memories) > self.max_memory_per_session:
+            # Keep high importance memories and recent ones
+            kept = 0
+            to_delete = []
+            
+            for memory_id, importance_score in session_memories:
+                if kept < self.max_memory_per_session and (
+                    importance_score >= 0.5 or kept < self.max_memory_per_session // 2
+                ):
+                    kept += 1
+                else:
+                    to_delete.append(memory_id)
+            
+            self.db.query(ConversationMemory).filter(
+                ConversationMemory.id.in_(to_delete)
+            ).delete(synchronize_session=False)
     
     def update_memory_importance(self, memory_id: int, new_importance: float):
         """Update the importance score of a specific memory"""
@@ -1,16 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date, timedelta
 from typing import Dict, Any, List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, extract
-from app.models.db_models import User, Meal, DailySummary
+from sqlalchemy import func, and_, case, cast, extract, literal, select, Float, Integer, String
+from sqlalchemy.dialects import postgresql, sqlite
+from app.database import session_scope
+from app.models.db_models import User, Meal, DailySummary, NUTRIENT_TOTAL_FIELDS, DAY_NAMES
+from cachetools import TTLCache
 import calendar
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Dashboards keyed by user_id first: daily by (user_id, date), weekly/monthly also by a summary change
+# stamp; a user's entries are dropped when their meals or goals change
+_daily_dashboard_cache = TTLCache(maxsize=2048, ttl=300)
+_daily_dashboard_lock = threading.Lock()
+
+def invalidate_daily_dashboard(user_id: int):
+    """Drop every cached dashboard (daily, weekly, monthly) for a user"""
+    with _daily_dashboard_lock:
+        for key in [key for key in _daily_dashboard_cache.keys() if key[0] == user_id]:
+            _daily_dashboard_cache.pop(key, None)
+
+# Share of a daily goal that counts as achieved
+GOAL_ACHIEVED_RATIO = 0.9
+
+def goal_met(total, goal):
+    """Goal check shared by the summary upsert (SQL expression) and the stored-summary read (plain numbers)"""
+    return total >= goal * GOAL_ACHIEVED_RATIO
+
+# Stale summaries found while serving a dashboard are recomputed here, off the request thread.
+# Pending holds (user_id, date) so repeated reads of one stale day queue a single refresh.
+_summary_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary-refresh")
+_summary_refresh_pending = set()
+_summary_refresh_lock = threading.Lock()
+
+def schedule_summary_refresh(user_id: int, target_date: date):
+    """Queue a background recompute of one daily summary unless one is already pending"""
+    key = (user_id, target_date)
+    with _summary_refresh_lock:
+        if key in _summary_refresh_pending:
+            return
+        _summary_refresh_pending.add(key)
+    _summary_refresh_executor.submit(_refresh_daily_summary, user_id, target_date)
+
+def _refresh_daily_summary(user_id: int, target_date: date):
+    try:
+        with session_scope() as db:
+            DashboardService(db).create_or_update_daily_summary(user_id, target_date)
+        invalidate_daily_dashboard(user_id)
+    finally:
+        with _summary_refresh_lock:
+            _summary_refresh_pending.discard((user_id, target_date))
+
+# Meal type by hour of day: breakfast 5-10, lunch 11-15, dinner 16-20, snack otherwise
+HOUR_TO_MEAL_TYPE = ("snack",) * 5 + ("breakfast",) * 6 + ("lunch",) * 5 + ("dinner",) * 5 + ("snack",) * 3
+
+# English month names for dashboard labels; avoids a locale-aware strftime per request
+_MONTH_NAMES = (
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December"
+)
+
+# Rows fetched per round-trip when streaming meal history
+MEAL_HISTORY_BATCH_SIZE = 200
 
 class DashboardService:
     def __init__(self, db: Session):
         self.db = db
     
     def update_meal_calendar_info(self, meal_id: int) -> bool:
-        """Update meal with calendar information (date, time, day of week)"""
+        """Update meal with calendar information (date and time; day of week derives from the date)"""
         try:
             meal = self.db.query(Meal).filter(Meal.id == meal_id).first()
             if not meal:
@@ -19,12 +81,12 @@ class DashboardService:
             now = datetime.now()
             meal.upload_date = now.date()
             meal.upload_time = now
-            meal.day_of_week = now.strftime("%A")  # Monday, Tuesday, etc.
             
             self.db.commit()
+            invalidate_daily_dashboard(meal.user_id)
             return True
-        except Exception as e:
-            print(f"Error updating meal calendar info: {e}")
+        except Exception:
+            logger.exception("Error updating meal calendar info")
             self.db.rollback()
             return False
     
@@ -34,75 +96,46 @@ class DashboardService:
             target_date = date.today()
         
         try:
-            # Get all meals for the day
-            meals = self.db.query(Meal).filter(
+            # Sum the day's denormalized nutrient columns in the database and pick up the user's
+            # goals (not the whole User row) in the same round-trip; only one row comes back
+            meal_totals = select(
+                *[func.coalesce(func.sum(getattr(Meal, field)), 0).label(field) for field in NUTRIENT_TOTAL_FIELDS],
+                func.count(Meal.id).label("meals_count")
+            ).where(
                 and_(
                     Meal.user_id == user_id,
                     Meal.upload_date == target_date
                 )
-            ).all()
-            
-            # Calculate totals
-            total_calories = 0
-            total_protein = 0
-            total_carbs = 0
-            total_fat = 0
-            total_fiber = 0
-            meals_count = len(meals)
-            
-            for meal in meals:
-                if meal.analysis_data:
-                    total_calories += meal.analysis_data.get("total_calories", 0)
-                    total_protein += meal.analysis_data.get("total_protein", 0)
-                    total_carbs += meal.analysis_data.get("total_carbs", 0)
-                    total_fat += meal.analysis_data.get("total_fat", 0)
-                    total_fiber += meal.analysis_data.get("total_fiber", 0)
-            
-            # Get user goals
-            user = self.db.query(User).filter(User.id == user_id).first()
-            daily_goals = user.daily_goals if user and user.daily_goals else {}
+            ).cte("meal_totals")
+            row = self.db.execute(
+                select(meal_totals, User.daily_goals)
+                .select_from(meal_totals)
+                .outerjoin(User, User.id == user_id)
+            ).one()
+            total_calories, total_protein, total_carbs, total_fat, total_fiber, meals_count = row[:-1]
+            daily_goals = row.daily_goals or {}
             
             goal_calories = daily_goals.get("calories", 2000)
             goal_protein = daily_goals.get("protein", 50)
             
-            # Check goal achievement
-            goal_calories_achieved = total_calories >= goal_calories * 0.9  # 90% threshold
-            goal_protein_achieved = total_protein >= goal_protein * 0.9
-            
-            # Create or update daily summary
-            summary = self.db.query(DailySummary).filter(
-                and_(
-                    DailySummary.user_id == user_id,
-                    DailySummary.date == target_date
-                )
-            ).first()
-            
-            if summary:
-                # Update existing
-                summary.total_calories = total_calories
-                summary.total_protein = total_protein
-                summary.total_carbs = total_carbs
-                summary.total_fat = total_fat
-                summary.total_fiber = total_fiber
-                summary.meals_count = meals_count
-                summary.goal_calories_achieved = goal_calories_achieved
-                summary.goal_protein_achieved = goal_protein_achieved
-                summary.updated_at = datetime.now()
-            else:
-                # Create new
-                summary = DailySummary(
-                    user_id=user_id,
-                    date=target_date,
-                    total_calories=total_calories,
-                    total_protein=total_protein,
-                    total_carbs=total_carbs,
-                    total_fat=total_fat,
-                    total_fiber=total_fiber,
-                    meals_count=meals_count,
-                    goal_calories_achieved=goal_calories_achieved,
-                    goal_protein_achieved=goal_protein_achieved
-                )
-                self.db.add(summary)
+            # Create or update daily summary in one statement, keyed on (user_id, date).
+            # Goal flags are evaluated by the database and handed back through RETURNING.
+            values = {
+                "total_calories": total_calories,
+                "total_protein": total_protein,
+                "total_carbs": total_carbs,
+                "total_fat": total_fat,
+                "total_fiber": total_fiber,
+                "meals_count": meals_count,
+                "goal_calories_achieved": goal_met(literal(total_calories, Float), goal_calories),
+                "goal_protein_achieved": goal_met(literal(total_protein, Float), goal_protein)
+            }
+            upsert = self.dialect_insert(DailySummary).values(user_id=user_id, date=target_date, **values)
+            goal_calories_achieved, goal_protein_achieved = self.db.execute(upsert.on_conflict_do_update(
+                index_elements=[DailySummary.user_id, DailySummary.date],
+                # Same clock as Meal.updated_at, which the freshness check compares against
+                set_={**values, "updated_at": func.now()}
+            ).returning(DailySummary.goal_calories_achieved, DailySummary.goal_protein_achieved)).one()
             
             self.db.commit()
             
@@ -122,8 +155,77 @@ class DashboardService:
                 }
             }
             
-        except Exception as e:
-            print(f"Error creating daily summary: {e}")
+        except Exception:
+            logger.exception("Error creating daily summary")
+            self.db.rollback()
+            return {}
+    
+    def dialect_insert(self, model):
+        """INSERT construct with ON CONFLICT support for the bound database"""
+        if self.db.get_bind().dialect.name == "postgresql":
+            return postgresql.insert(model)
+        return sqlite.insert(model)
+    
+    def get_daily_summary(self, user_id: int, target_date: date) -> Dict[str, Any]:
+        """Serve the stored daily summary. A stale summary for today is rebuilt inline, so its totals
+        agree with the live meal breakdown; an older day's is recomputed in the background and the
+        stored figures are returned with refresh_pending set"""
+        try:
+            meals_count, last_meal_change = self.db.query(
+                func.count(Meal.id), func.max(Meal.updated_at)
+            ).filter(
+                and_(
+                    Meal.user_id == user_id,
+                    Meal.upload_date == target_date
+                )
+            ).one()
+            summary = self.db.query(DailySummary).filter(
+                and_(
+                    DailySummary.user_id == user_id,
+                    DailySummary.date == target_date
+                )
+            ).first()
+            
+            # A deleted meal doesn't move max(updated_at), so the count has to match too. Ties count as
+            # fresh: log_meal's upsert can land in the same second as the meal on second-precision clocks.
+            fresh = (
+                summary is not None
+                and summary.updated_at is not None
+                and summary.meals_count == meals_count
+                and (last_meal_change is None or summary.updated_at >= last_meal_change)
+            )
+            if not fresh:
+                # Nothing stored yet, or today's figures sit next to the live breakdown: build inline
+                if summary is None or target_date == date.today():
+                    return self.create_or_update_daily_summary(user_id, target_date)
+                schedule_summary_refresh(user_id, target_date)
+            
+            # Goals can change without touching meals, so goal flags are re-derived from the stored totals
+            daily_goals = self.db.query(User.daily_goals).filter(User.id == user_id).scalar() or {}
+            goal_calories = daily_goals.get("calories", 2000)
+            goal_protein = daily_goals.get("protein", 50)
+            
+            summary_data = {
+                "date": target_date.isoformat(),
+                "total_calories": summary.total_calories,
+                "total_protein": summary.total_protein,
+                "total_carbs": summary.total_carbs,
+                "total_fat": summary.total_fat,
+                "total_fiber": summary.total_fiber,
+                "meals_count": summary.meals_count,
+                "goal_calories_achieved": goal_met(summary.total_calories, goal_calories),
+                "goal_protein_achieved": goal_met(summary.total_protein, goal_protein),
+                "goals": {
+                    "calories": goal_calories,
+                    "protein": goal_protein
+                }
+            }
+            if not fresh:
+                summary_data["refresh_pending"] = True
+            return summary_data
+            
+        except Exception:
+            logger.exception("Error reading daily summary")
             self.db.rollback()
             return {}
     
@@ -132,16 +234,29 @@ class DashboardService:
         if not target_date:
             target_date = date.today()
         
-        # Ensure daily summary is up to date
-        summary_data = self.create_or_update_daily_summary(user_id, target_date)
+        cache_key = (user_id, target_date)
+        with _daily_dashboard_lock:
+            cached = _daily_dashboard_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
-        # Get meals for the day with breakdown by meal type
-        meals = self.db.query(Meal).filter(
+        # Stored summary; a stale one for a past day is served as-is while it is refreshed in the background
+        summary_data = self.get_daily_summary(user_id, target_date)
+        
+        # Count and calorie totals per meal type, classified and grouped in the database
+        meal_type = self.meal_type_expression().label("meal_type")
+        breakdown_rows = self.db.query(
+            meal_type,
+            func.count(Meal.id),
+            func.coalesce(func.sum(Meal.total_calories), 0)
+        ).filter(
             and_(
                 Meal.user_id == user_id,
-                Meal.upload_date == target_date
+                Meal.upload_date == target_date,
+                # Meals logged without an analysis are left out of the breakdown
+                cast(Meal.analysis_data, String).notin_(["{}", "null"])
             )
-        ).order_by(Meal.upload_time).all()
+        ).group_by(meal_type).all()
         
         meal_breakdown = {
             "breakfast": {"count": 0, "calories": 0},
@@ -150,19 +265,21 @@ class DashboardService:
             "snack": {"count": 0, "calories": 0}
         }
         
-        for meal in meals:
-            meal_type = self.determine_meal_type(meal.upload_time.time()) if meal.upload_time else "snack"
-            if meal.analysis_data:
-                calories = meal.analysis_data.get("total_calories", 0)
-                meal_breakdown[meal_type]["count"] += 1
-                meal_breakdown[meal_type]["calories"] += calories
+        for meal_type_name, count, calories in breakdown_rows:
+            meal_breakdown[meal_type_name] = {"count": count, "calories": calories}
         
-        return {
+        dashboard = {
             **summary_data,
             "meal_breakdown": meal_breakdown,
-            "day_of_week": target_date.strftime("%A"),
-            "date_formatted": target_date.strftime("%B %d, %Y")
+            "day_of_week": DAY_NAMES[target_date.weekday()],
+            "date_formatted": f"{_MONTH_NAMES[target_date.month - 1]} {target_date.day:02d}, {target_date.year}"
         }
+        
+        # An empty summary means the recompute failed and a pending one is about to change; don't pin either
+        if summary_data and not summary_data.get("refresh_pending"):
+            with _daily_dashboard_lock:
+                _daily_dashboard_cache[cache_key] = dashboard
+        return dashboard
     
     def get_weekly_dashboard(self, user_id: int, start_date: date = None) -> Dict[str, Any]:
         """Get weekly dashboard data"""
@@ -172,39 +289,30 @@ class DashboardService:
         
         end_date = start_date + timedelta(days=6)  # End of week (Sunday)
         
-        # Get daily summaries for the week
-        summaries = self.db.query(DailySummary).filter(
-            and_(
-                DailySummary.user_id == user_id,
-                DailySummary.date >= start_date,
-                DailySummary.date <= end_date
-            )
-        ).order_by(DailySummary.date).all()
+        # Reuse the last build while the week's summaries are unchanged
+        cache_key = (user_id, "weekly", start_date, self.summary_stamp(user_id, start_date, end_date))
+        with _daily_dashboard_lock:
+            cached = _daily_dashboard_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
-        # Calculate weekly totals and averages
-        total_calories = sum(s.total_calories for s in summaries)
-        total_protein = sum(s.total_protein for s in summaries)
-        total_carbs = sum(s.total_carbs for s in summaries)
-        total_fat = sum(s.total_fat for s in summaries)
-        total_meals = sum(s.meals_count for s in summaries)
+        # Weekly totals and goal-day counts come back from the database as one row
+        (total_calories, total_protein, total_carbs, total_fat, total_meals,
+         days_calories_achieved, days_protein_achieved, days_with_data) = self.summary_totals(user_id, start_date, end_date)
         
-        days_with_data = len(summaries)
         avg_calories = total_calories / days_with_data if days_with_data > 0 else 0
         avg_protein = total_protein / days_with_data if days_with_data > 0 else 0
         
-        # Goal achievement stats
-        days_calories_achieved = sum(1 for s in summaries if s.goal_calories_achieved)
-        days_protein_achieved = sum(1 for s in summaries if s.goal_protein_achieved)
-        
         # Daily breakdown
+        summaries_by_date = {s.date: s for s in self.summary_rows(user_id, start_date, end_date)}
         daily_data = []
         for i in range(7):
             current_date = start_date + timedelta(days=i)
-            day_summary = next((s for s in summaries if s.date == current_date), None)
+            day_summary = summaries_by_date.get(current_date)
             
             daily_data.append({
                 "date": current_date.isoformat(),
-                "day_name": current_date.strftime("%A"),
+                "day_name": DAY_NAMES[current_date.weekday()],
                 "calories": day_summary.total_calories if day_summary else 0,
                 "protein": day_summary.total_protein if day_summary else 0,
                 "meals_count": day_summary.meals_count if day_summary else 0,
@@ -214,7 +322,7 @@ class DashboardService:
                 }
             })
         
-        return {
+        dashboard = {
             "week_start": start_date.isoformat(),
             "week_end": end_date.isoformat(),
             "totals": {
@@ -235,6 +343,10 @@ class DashboardService:
             },
             "daily_data": daily_data
         }
+        
+        with _daily_dashboard_lock:
+            _daily_dashboard_cache[cache_key] = dashboard
+        return dashboard
     
     def get_monthly_dashboard(self, user_id: int, year: int = None, month: int = None) -> Dict[str, Any]:
         """Get monthly dashboard data"""
@@ -244,64 +356,59 @@ class DashboardService:
             month = today.month
         
         # Get first and last day of month
+        month_len = calendar.monthrange(year, month)[1]
         first_day = date(year, month, 1)
-        last_day = date(year, month, calendar.monthrange(year, month)[1])
+        last_day = date(year, month, month_len)
         
-        # Get daily summaries for the month
-        summaries = self.db.query(DailySummary).filter(
-            and_(
-                DailySummary.user_id == user_id,
-                DailySummary.date >= first_day,
-                DailySummary.date <= last_day
-            )
-        ).order_by(DailySummary.date).all()
+        # Reuse the last build while the month's summaries are unchanged
+        cache_key = (user_id, "monthly", first_day, self.summary_stamp(user_id, first_day, last_day))
+        with _daily_dashboard_lock:
+            cached = _daily_dashboard_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
-        # Calculate monthly totals and averages
-        total_calories = sum(s.total_calories for s in summaries)
-        total_protein = sum(s.total_protein for s in summaries)
-        total_carbs = sum(s.total_carbs for s in summaries)
-        total_fat = sum(s.total_fat for s in summaries)
-        total_meals = sum(s.meals_count for s in summaries)
+        # Monthly totals and goal-day counts come back from the database as one row
+        (total_calories, total_protein, total_carbs, total_fat, total_meals,
+         days_calories_achieved, days_protein_achieved, days_with_data) = self.summary_totals(user_id, first_day, last_day)
         
-        days_with_data = len(summaries)
         avg_calories = total_calories / days_with_data if days_with_data > 0 else 0
         avg_protein = total_protein / days_with_data if days_with_data > 0 else 0
         
-        # Goal achievement stats
-        days_calories_achieved = sum(1 for s in summaries if s.goal_calories_achieved)
-        days_protein_achieved = sum(1 for s in summaries if s.goal_protein_achieved)
-        
-        # Weekly breakdown
+        # Weekly breakdown; weeks run from the 1st, 8th, 15th, 22nd and 29th, bucketed by the database
+        week_bucket = ((cast(extract("day", DailySummary.date), Integer) - 1) // 7).label("week_bucket")
+        week_totals = {
+            bucket: (calories, protein, meals, days)
+            for bucket, calories, protein, meals, days in self.db.query(
+                week_bucket,
+                func.sum(DailySummary.total_calories),
+                func.sum(DailySummary.total_protein),
+                func.sum(DailySummary.meals_count),
+                func.count(DailySummary.id)
+            ).filter(
+                and_(
+                    DailySummary.user_id == user_id,
+                    DailySummary.date >= first_day,
+                    DailySummary.date <= last_day
+                )
+            ).group_by(week_bucket).all()
+        }
         weekly_data = []
-        current_date = first_day
-        week_num = 1
-        
-        while current_date <= last_day:
-            week_start = current_date
-            week_end = min(current_date + timedelta(days=6), last_day)
-            
-            week_summaries = [s for s in summaries if week_start <= s.date <= week_end]
-            week_calories = sum(s.total_calories for s in week_summaries)
-            week_protein = sum(s.total_protein for s in week_summaries)
-            week_meals = sum(s.meals_count for s in week_summaries)
-            
+        for bucket in range((month_len + 6) // 7):
+            week_calories, week_protein, week_meals, days_tracked = week_totals.get(bucket, (0, 0, 0, 0))
             weekly_data.append({
-                "week_number": week_num,
-                "start_date": week_start.isoformat(),
-                "end_date": week_end.isoformat(),
+                "week_number": bucket + 1,
+                "start_date": date(year, month, bucket * 7 + 1).isoformat(),
+                "end_date": date(year, month, min(bucket * 7 + 7, month_len)).isoformat(),
                 "calories": week_calories,
                 "protein": week_protein,
                 "meals": week_meals,
-                "days_tracked": len(week_summaries)
+                "days_tracked": days_tracked
             })
-            
-            current_date = week_end + timedelta(days=1)
-            week_num += 1
         
-        return {
+        dashboard = {
             "year": year,
             "month": month,
-            "month_name": calendar.month_name[month],
+            "month_name": _MONTH_NAMES[month - 1],
             "totals": {
                 "calories": total_calories,
                 "protein": total_protein,
@@ -321,22 +428,78 @@ class DashboardService:
                 "protein_percentage": round((days_protein_achieved / days_with_data * 100), 1) if days_with_data > 0 else 0
             },
             "weekly_data": weekly_data,
-            "days_in_month": calendar.monthrange(year, month)[1],
+            "days_in_month": month_len,
             "days_tracked": days_with_data
         }
+        
+        with _daily_dashboard_lock:
+            _daily_dashboard_cache[cache_key] = dashboard
+        return dashboard
+    
+    def summary_stamp(self, user_id: int, start_date: date, end_date: date):
+        """Cheap change marker for a range of summaries: (last update, row count, meal count)"""
+        return tuple(self.db.query(
+            func.max(DailySummary.updated_at),
+            func.count(DailySummary.id),
+            func.sum(DailySummary.meals_count)
+        ).filter(
+            and_(
+                DailySummary.user_id == user_id,
+                DailySummary.date >= start_date,
+                DailySummary.date <= end_date
+            )
+        ).one())
+    
+    def summary_totals(self, user_id: int, start_date: date, end_date: date):
+        """Nutrient sums, meal count, goal-met days and tracked days over a date range, in one query"""
+        return self.db.query(
+            func.coalesce(func.sum(DailySummary.total_calories), 0),
+            func.coalesce(func.sum(DailySummary.total_protein), 0),
+            func.coalesce(func.sum(DailySummary.total_carbs), 0),
+            func.coalesce(func.sum(DailySummary.total_fat), 0),
+            func.coalesce(func.sum(DailySummary.meals_count), 0),
+            func.coalesce(func.sum(case((DailySummary.goal_calories_achieved, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((DailySummary.goal_protein_achieved, 1), else_=0)), 0),
+            func.count(DailySummary.id)
+        ).filter(
+            and_(
+                DailySummary.user_id == user_id,
+                DailySummary.date >= start_date,
+                DailySummary.date <= end_date
+            )
+        ).one()
+    
+    def summary_rows(self, user_id: int, start_date: date, end_date: date):
+        """Per-day summary columns the weekly breakdown needs, as plain rows"""
+        return self.db.query(
+            DailySummary.date,
+            DailySummary.total_calories,
+            DailySummary.total_protein,
+            DailySummary.meals_count,
+            DailySummary.goal_calories_achieved,
+            DailySummary.goal_protein_achieved
+        ).filter(
+            and_(
+                DailySummary.user_id == user_id,
+                DailySummary.date >= start_date,
+                DailySummary.date <= end_date
+            )
+        ).order_by(DailySummary.date).all()
+    
+    def meal_type_expression(self):
+        """SQL CASE equivalent of determine_meal_type over Meal.upload_time"""
+        hour = extract("hour", Meal.upload_time)
+        return case(
+            (Meal.upload_time.is_(None), "snack"),
+            (and_(hour >= 5, hour < 11), "breakfast"),
+            (and_(hour >= 11, hour < 16), "lunch"),
+            (and_(hour >= 16, hour < 21), "dinner"),
+            else_="snack"
+        )
     
     def determine_meal_type(self, meal_time) -> str:
         """Determine meal type based on time of day"""
-        hour = meal_time.hour
-        
-        if 5 <= hour < 11:
-            return "breakfast"
-        elif 11 <= hour < 16:
-            return "lunch"
-        elif 16 <= hour < 21:
-            return "dinner"
-        else:
-            return "snack"
+        return HOUR_TO_MEAL_TYPE[meal_time.hour]
     
     def set_user_goals(self, user_id: int, goals: Dict[str, Any]) -> bool:
         """Set daily goals for a user"""
@@ -358,10 +521,11 @@ class DashboardService:
             user.updated_at = datetime.now()
             
             self.db.commit()
+            invalidate_daily_dashboard(user_id)
             return True
             
-        except Exception as e:
-            print(f"Error setting user goals: {e}")
+        except Exception:
+            logger.exception("Error setting user goals")
             self.db.rollback()
             return False
     
@@ -371,29 +535,35 @@ class DashboardService:
             end_date = date.today()
             start_date = end_date - timedelta(days=days)
             
-            meals = self.db.query(Meal).filter(
+            # Plain rows holding just the columns we return; no ORM objects to hydrate.
+            # Fetched in batches off a server-side cursor so a long history never sits in
+            # memory twice (driver buffer plus the dicts built below).
+            rows = self.db.query(
+                Meal.id, Meal.upload_date, Meal.upload_time,
+                Meal.analysis_data, Meal.created_at
+            ).filter(
                 and_(
                     Meal.user_id == user_id,
                     Meal.upload_date >= start_date,
                     Meal.upload_date <= end_date
                 )
-            ).order_by(Meal.upload_time.desc()).all()
+            ).order_by(Meal.upload_time.desc()).execution_options(stream_results=True).yield_per(MEAL_HISTORY_BATCH_SIZE)
             
-            meal_history = []
-            for meal in meals:
-                meal_data = {
-                    "id": meal.id,
-                    "upload_date": meal.upload_date.isoformat() if meal.upload_date else None,
-                    "upload_time": meal.upload_time.isoformat() if meal.upload_time else None,
-                    "day_of_week": meal.day_of_week,
-                    "meal_type": self.determine_meal_type(meal.upload_time.time()) if meal.upload_time else "unknown",
-                    "analysis_data": meal.analysis_data,
-                    "created_at": meal.created_at.isoformat() if meal.created_at else None
+            meal_history = [
+                {
+                    "id": row.id,
+                    "upload_date": row.upload_date.isoformat() if row.upload_date else None,
+                    "upload_time": row.upload_time.isoformat() if row.upload_time else None,
+                    "day_of_week": DAY_NAMES[row.upload_date.weekday()] if row.upload_date else None,
+                    "meal_type": HOUR_TO_MEAL_TYPE[row.upload_time.hour] if row.upload_time else "unknown",
+                    "analysis_data": row.analysis_data,
+                    "created_at": row.created_at.isoformat() if row.created_at else None
                 }
-                meal_history.append(meal_data)
+                for row in rows
+            ]
             
             return meal_history
             
-        except Exception as e:
-            print(f"Error getting meal history: {e}")
+        except Exception:
+            logger.exception("Error getting meal history")
             return []
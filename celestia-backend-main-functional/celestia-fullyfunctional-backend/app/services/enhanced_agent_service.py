@@ -1,19 +1,130 @@
+from dataclasses import asdict, dataclass, field
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
 from sqlalchemy.orm import Session
-import google.generativeai as genai
-from app.config import settings
+from app.services.gemini_client import generate_content_async
+from app.services.response_cache import prompt_key, response_cache
 from app.services.conversation_memory_service import ConversationMemoryService
-from app.services.health_monitoring_service import HealthMonitoringService
+from app.services.health_monitoring_service import HealthMonitoringService, URGENT_SEVERITIES
 from app.services.smart_notification_service import SmartNotificationService
 from app.services.intelligent_meal_planner import IntelligentMealPlanner
 from app.services.agent_service import HealthCoachAgent
+from app.database import session_scope
+from cachetools import TTLCache
+import asyncio
 import json
+import re
+import threading
 import uuid
 
-# Configure Gemini AI
-genai.configure(api_key=settings.google_api_key)
-enhanced_agent_model = genai.GenerativeModel("models/gemini-2.0-flash")
+# Chat prompt template, built once at import; only the placeholders are filled per turn
+ENHANCED_PROMPT = """
+        You are an advanced AI Health Coach with comprehensive knowledge of the user's health journey.
+        You have access to conversation memory, health monitoring data, and predictive insights.
+        
+        CONVERSATION CONTEXT:
+        Recent conversation history:
+        {conversation_history}
+        
+        HEALTH MONITORING INSIGHTS:
+        Active alerts: {alert_count}
+        Recent monitoring: {recent_alerts}
+        Health patterns detected: {patterns}
+        
+        CURRENT USER MESSAGE: {message}
+        
+        CURRENT MEAL CONTEXT:
+        {current_analysis}
+        
+        RESPONSE GUIDELINES:
+        1. Use conversation memory to provide personalized, contextual responses
+        2. Reference previous conversations when relevant
+        3. Proactively address any health alerts or concerns
+        4. Provide actionable, specific advice based on their patterns
+        5. Be encouraging and supportive while being informative
+        6. Keep responses concise but comprehensive
+        7. If there are urgent health alerts, prioritize addressing them
+        
+        RESPONSE FORMAT:
+        Provide a natural, conversational response that:
+        - Acknowledges their message and any relevant history
+        - Addresses health concerns proactively if present
+        - Gives specific, actionable advice
+        - Encourages continued engagement with their health journey
+        
+        Remember: You have deep knowledge of their health patterns, preferences, and goals.
+        Use this to provide truly personalized guidance.
+        """
+
+# Keyword categories looked for in a reply, found in one scan. The alternation sits in a zero-width
+# lookahead so every position is tried: overlapping keywords are all seen, as with substring checks.
+_RESPONSE_KEYWORD_RE = re.compile(
+    r"(?=(?P<alert>alert|concern|warning|urgent)|(?P<plan>plan)|(?P<schedule>schedule)"
+    r"|(?P<goal>goal|target|progress)|(?P<reminder>reminder|remember|don't forget)"
+    r"|(?P<try>try|consider)|(?P<track>track|log))"
+)
+
+# Planning and goal phrases in a user message that warrant a meal plan suggestion
+MEAL_PLANNING_HINTS = (
+    'plan', 'meal plan', 'what should i eat', 'help me plan', 'weekly meals',
+    'goal', 'target', 'lose weight', 'gain weight', 'healthy eating'
+)
+_MEAL_PLANNING_HINT_RE = re.compile("|".join(map(re.escape, MEAL_PLANNING_HINTS)))
+
+# Assembled health dashboards by user_id. The UI polls this view, so a short TTL absorbs repeat
+# builds; writes that change what it shows drop the user's entry via invalidate_health_dashboard.
+_health_dashboard_cache = TTLCache(maxsize=10000, ttl=30)
+_health_dashboard_lock = threading.Lock()
+
+def invalidate_health_dashboard(user_id: int):
+    """Drop a user's cached health dashboard"""
+    with _health_dashboard_lock:
+        _health_dashboard_cache.pop(user_id, None)
+
+# Best-effort writes started with asyncio.create_task; held here so they aren't collected mid-flight
+_background_writes = set()
+
+@dataclass(slots=True)
+class EnhancedResponse:
+    """Reply from _generate_enhanced_response, with the defaults callers used to fill in themselves"""
+    message: str
+    response_type: str = 'general'
+    confidence: float = 0.8
+    actions: List[str] = field(default_factory=list)
+    trigger_notifications: bool = False
+
+def run_in_own_session(service_cls, method: str, *args, **kwargs):
+    """Call service_cls(db).<method>(...) on a short-lived session of its own.
+
+    Used for calls that run on worker threads at the same time: a Session must never be
+    shared across threads, so none of them touch the request's session.
+    """
+    with session_scope() as db:
+        return getattr(service_cls(db), method)(*args, **kwargs)
+
+def store_and_recall(user_id: int, session_id: str, message: str, user_context: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Store the user's message, then fetch contextual memories; ordered so the new message is visible"""
+    with session_scope() as db:
+        memory = ConversationMemoryService(db)
+        memory.store_conversation(
+            user_id=user_id,
+            session_id=session_id,
+            message_type='user',
+            content=message,
+            context_data=user_context
+        )
+        return memory.get_contextual_memory(
+            user_id=user_id,
+            current_context=user_context,
+            limit=5
+        )
+
+def monitor_and_list_alerts(user_id: int):
+    """Run (or reuse a recent) health monitoring, then list active alerts including any it raised"""
+    with session_scope() as db:
+        monitor = HealthMonitoringService(db)
+        return monitor.get_recent_monitoring(user_id), monitor.get_active_alerts(user_id)
+
 
 class EnhancedAgenticService:
     """
@@ -34,9 +145,6 @@ class EnhancedAgenticService:
         self.notification_service = SmartNotificationService(db)
         self.meal_planner = IntelligentMealPlanner(db)
         self.base_agent = HealthCoachAgent(db)
-        
-        # Session management
-        self.active_sessions = {}  # Store active conversation sessions
     
     async def enhanced_chat(
         self, 
@@ -54,29 +162,16 @@ class EnhancedAgenticService:
             if not session_id:
                 session_id = self.conversation_memory.create_session_id()
             
-            # Store user message in conversation memory
+            # Memory (store the message, recall context) and proactive health monitoring (then
+            # its alerts) don't depend on each other; run both chains on worker threads at once
             user_context = context or {}
-            memory_entry = self.conversation_memory.store_conversation(
-                user_id=user_id,
-                session_id=session_id,
-                message_type='user',
-                content=message,
-                context_data=user_context
+            contextual_memories, (monitoring_results, active_alerts) = await asyncio.gather(
+                asyncio.to_thread(store_and_recall, user_id, session_id, message, user_context),
+                asyncio.to_thread(monitor_and_list_alerts, user_id)
             )
             
-            # Get contextual memory for enhanced responses
-            contextual_memories = self.conversation_memory.get_contextual_memory(
-                user_id=user_id,
-                current_context=user_context,
-                limit=5
-            )
-            
-            # Run proactive health monitoring
-            monitoring_results = self.health_monitor.run_health_monitoring(user_id)
-            
             # Check for any urgent alerts
-            active_alerts = self.health_monitor.get_active_alerts(user_id)
-            urgent_alerts = [alert for alert in active_alerts if alert['severity'] in ['high', 'critical']]
+            urgent_alerts = [alert for alert in active_alerts if alert['severity'] in URGENT_SEVERITIES]
             
             # Generate enhanced response using all available context
             enhanced_context = {
@@ -94,21 +189,27 @@ class EnhancedAgenticService:
                 context=enhanced_context
             )
             
-            # Store agent response in conversation memory
-            self.conversation_memory.store_conversation(
+            # Store agent response in conversation memory; best-effort, so the reply doesn't wait for it
+            write = asyncio.create_task(asyncio.to_thread(
+                run_in_own_session, ConversationMemoryService, 'store_conversation',
                 user_id=user_id,
                 session_id=session_id,
                 message_type='agent',
-                content=agent_response['message'],
+                content=agent_response.message,
                 context_data={
-                    'response_type': agent_response.get('response_type', 'general'),
-                    'confidence': agent_response.get('confidence', 0.8),
-                    'actions_suggested': agent_response.get('actions', [])
+                    'response_type': agent_response.response_type,
+                    'confidence': agent_response.confidence,
+                    'actions_suggested': agent_response.actions
                 }
-            )
+            ))
+            _background_writes.add(write)
+            write.add_done_callback(_background_writes.discard)
+            
+            # The chat stored messages and ran monitoring, both shown on the health dashboard
+            invalidate_health_dashboard(user_id)
             
             # Generate smart notifications if appropriate
-            if agent_response.get('trigger_notifications', False):
+            if agent_response.trigger_notifications:
                 notification_results = self.notification_service.generate_smart_notifications(user_id)
             else:
                 notification_results = {'notifications_generated': 0}
@@ -119,8 +220,8 @@ class EnhancedAgenticService:
                 meal_plan_suggestion = self._generate_meal_plan_suggestion(user_id)
             
             return {
-                'message': agent_response['message'],
-                'response_type': agent_response.get('response_type', 'general'),
+                'message': agent_response.message,
+                'response_type': agent_response.response_type,
                 'session_id': session_id,
                 'contextual_insights': {
                     'memories_used': len(contextual_memories),
@@ -133,10 +234,10 @@ class EnhancedAgenticService:
                     'meal_plan_suggested': meal_plan_suggestion is not None,
                     'health_insights': monitoring_results.get('insights_generated', 0)
                 },
-                'suggested_actions': agent_response.get('actions', []),
+                'suggested_actions': agent_response.actions,
                 'meal_plan_suggestion': meal_plan_suggestion,
                 'urgent_alerts': urgent_alerts,
-                'confidence': agent_response.get('confidence', 0.8),
+                'confidence': agent_response.confidence,
                 'timestamp': datetime.now().isoformat()
             }
             
@@ -154,38 +255,46 @@ class EnhancedAgenticService:
         user_id: int, 
         message: str, 
         context: Dict[str, Any]
-    ) -> Dict[str, Any]:
+    ) -> EnhancedResponse:
         """Generate enhanced AI response using all available context"""
         
         # Build comprehensive prompt with all context
         prompt = self._build_enhanced_prompt(user_id, message, context)
         
+        # The prompt carries every input to the reply, so an identical prompt can reuse it
+        cache_key = prompt_key(prompt)
+        cached = await asyncio.to_thread(response_cache.get, cache_key)
+        if cached is not None:
+            return EnhancedResponse(**cached)
+        
         try:
-            # Generate response using AI
-            response = enhanced_agent_model.generate_content(prompt)
+            # Generate response using AI; off the event loop and within the shared concurrency bound
+            response = await generate_content_async(prompt)
             response_text = response.text
             
             # Analyze response for actions and insights
             response_analysis = self._analyze_response(response_text, context)
             
-            return {
-                'message': response_text,
-                'response_type': response_analysis.get('type', 'general'),
-                'confidence': response_analysis.get('confidence', 0.8),
-                'actions': response_analysis.get('actions', []),
-                'trigger_notifications': response_analysis.get('trigger_notifications', False)
-            }
+            result = EnhancedResponse(
+                message=response_text,
+                response_type=response_analysis['type'],
+                confidence=response_analysis['confidence'],
+                actions=response_analysis['actions'],
+                trigger_notifications=response_analysis['trigger_notifications']
+            )
+            # Only real replies are cached; the fallback below is not
+            await asyncio.to_thread(response_cache.set, cache_key, asdict(result))
+            return result
             
         except Exception as e:
             print(f"Error generating enhanced response: {e}")
             # Fallback to base agent
             fallback_response = await self.base_agent.chat(message, context)
-            return {
-                'message': fallback_response,
-                'response_type': 'fallback',
-                'confidence': 0.6,
-                'actions': []
-            }
+            return EnhancedResponse(
+                message=fallback_response,
+                response_type='fallback',
+                confidence=0.6
+            )
     
     def _build_enhanced_prompt(self, user_id: int, message: str, context: Dict[str, Any]) -> str:
         """Build comprehensive prompt with all available context"""
@@ -194,43 +303,16 @@ class EnhancedAgenticService:
         health_alerts = context.get('health_alerts', [])
         monitoring_insights = context.get('monitoring_insights', {})
         
-        prompt = f"""
-        You are an advanced AI Health Coach with comprehensive knowledge of the user's health journey.
-        You have access to conversation memory, health monitoring data, and predictive insights.
-        
-        CONVERSATION CONTEXT:
-        Recent conversation history:
-        {self._format_conversation_history(conversation_history)}
-        
-        HEALTH MONITORING INSIGHTS:
-        Active alerts: {len(health_alerts)}
-        Recent monitoring: {json.dumps(monitoring_insights.get('alerts', [])[:3], indent=2)}
-        Health patterns detected: {json.dumps(monitoring_insights.get('patterns', [])[:2], indent=2)}
-        
-        CURRENT USER MESSAGE: {message}
-        
-        CURRENT MEAL CONTEXT:
-        {json.dumps(context.get('current_analysis', {}), indent=2) if context.get('current_analysis') else 'No current meal analysis'}
-        
-        RESPONSE GUIDELINES:
-        1. Use conversation memory to provide personalized, contextual responses
-        2. Reference previous conversations when relevant
-        3. Proactively address any health alerts or concerns
-        4. Provide actionable, specific advice based on their patterns
-        5. Be encouraging and supportive while being informative
-        6. Keep responses concise but comprehensive
-        7. If there are urgent health alerts, prioritize addressing them
-        
-        RESPONSE FORMAT:
-        Provide a natural, conversational response that:
-        - Acknowledges their message and any relevant history
-        - Addresses health concerns proactively if present
-        - Gives specific, actionable advice
-        - Encourages continued engagement with their health journey
-        
-        Remember: You have deep knowledge of their health patterns, preferences, and goals.
-        Use this to provide truly personalized guidance.
-        """
+        current_analysis = context.get('current_analysis')
+        prompt = ENHANCED_PROMPT.format(
+            conversation_history=self._format_conversation_history(conversation_history),
+            alert_count=len(health_alerts),
+            # Compact JSON: the model reads it just as well and it is cheaper to build than indent=2
+            recent_alerts=json.dumps(monitoring_insights.get('alerts', [])[:3], separators=(',', ':')),
+            patterns=json.dumps(monitoring_insights.get('patterns', [])[:2], separators=(',', ':')),
+            message=message,
+            current_analysis=json.dumps(current_analysis, separators=(',', ':')) if current_analysis else 'No current meal analysis'
+        )
         
         return prompt
     
@@ -248,7 +330,7 @@ class EnhancedAgenticService:
     def _analyze_response(self, response_text: str, context: Dict[str, Any]) -> Dict[str, Any]:
         """Analyze the generated response for type, confidence, and actions"""
         
-        response_lower = response_text.lower()
+        hits = {match.lastgroup for match in _RESPONSE_KEYWORD_RE.finditer(response_text.lower())}
         analysis = {
             'type': 'general',
             'confidence': 0.8,
@@ -257,43 +339,32 @@ class EnhancedAgenticService:
         }
         
         # Determine response type
-        if any(word in response_lower for word in ['alert', 'concern', 'warning', 'urgent']):
+        if 'alert' in hits:
             analysis['type'] = 'health_alert'
             analysis['confidence'] = 0.9
-        elif any(word in response_lower for word in ['plan', 'schedule', 'meal planning']):
+        elif 'plan' in hits or 'schedule' in hits:
             analysis['type'] = 'meal_planning'
             analysis['trigger_notifications'] = True
-        elif any(word in response_lower for word in ['goal', 'target', 'progress']):
+        elif 'goal' in hits:
             analysis['type'] = 'goal_tracking'
-        elif any(word in response_lower for word in ['reminder', 'remember', 'don\'t forget']):
+        elif 'reminder' in hits:
             analysis['type'] = 'reminder'
             analysis['trigger_notifications'] = True
         
         # Extract suggested actions
-        if 'try' in response_lower or 'consider' in response_lower:
+        if 'try' in hits:
             analysis['actions'].append('dietary_adjustment')
-        if 'track' in response_lower or 'log' in response_lower:
+        if 'track' in hits:
             analysis['actions'].append('meal_tracking')
-        if 'plan' in response_lower:
+        if 'plan' in hits:
             analysis['actions'].append('meal_planning')
         
         return analysis
     
     def _should_suggest_meal_planning(self, message: str, context: Dict[str, Any]) -> bool:
         """Determine if meal planning should be suggested"""
-        message_lower = message.lower()
-        
         # Suggest meal planning if user asks about planning or goals
-        planning_keywords = ['plan', 'meal plan', 'what should i eat', 'help me plan', 'weekly meals']
-        if any(keyword in message_lower for keyword in planning_keywords):
-            return True
-        
-        # Suggest if user has goal-related queries
-        goal_keywords = ['goal', 'target', 'lose weight', 'gain weight', 'healthy eating']
-        if any(keyword in message_lower for keyword in goal_keywords):
-            return True
-        
-        return False
+        return _MEAL_PLANNING_HINT_RE.search(message.lower()) is not None
     
     def _generate_meal_plan_suggestion(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Generate a meal plan suggestion"""
@@ -323,25 +394,27 @@ class EnhancedAgenticService:
             print(f"Error generating meal plan suggestion: {e}")
             return None
     
-    def get_user_health_dashboard(self, user_id: int) -> Dict[str, Any]:
+    async def get_user_health_dashboard(self, user_id: int) -> Dict[str, Any]:
         """Get comprehensive health dashboard with all agentic insights"""
+        with _health_dashboard_lock:
+            cached = _health_dashboard_cache.get(user_id)
+        if cached is not None:
+            return cached
+        
         try:
-            # Get conversation summary
-            conversation_summary = self.conversation_memory.get_user_conversation_summary(user_id)
-            
-            # Get active alerts
-            active_alerts = self.health_monitor.get_active_alerts(user_id)
-            
-            # Get pending notifications
-            pending_notifications = self.notification_service.get_pending_notifications(user_id)
-            
-            # Get meal plans
-            meal_plans = self.meal_planner.get_user_meal_plans(user_id, active_only=True)
-            
-            # Run health monitoring for latest insights
-            monitoring_results = self.health_monitor.run_health_monitoring(user_id)
+            # Conversation summary, active alerts, pending notifications, meal plans and recent
+            # monitoring results are independent; each runs on its own worker thread and session
+            (conversation_summary, active_alerts, pending_notifications,
+             meal_plans, monitoring_results) = await asyncio.gather(
+                asyncio.to_thread(run_in_own_session, ConversationMemoryService, 'get_user_conversation_summary', user_id),
+                asyncio.to_thread(run_in_own_session, HealthMonitoringService, 'get_active_alerts', user_id),
+                asyncio.to_thread(run_in_own_session, SmartNotificationService, 'get_pending_notifications', user_id),
+                asyncio.to_thread(run_in_own_session, IntelligentMealPlanner, 'get_user_meal_plans', user_id, active_only=True),
+                asyncio.to_thread(run_in_own_session, HealthMonitoringService, 'get_recent_monitoring', user_id)
+            )
+            urgent_alerts = [a for a in active_alerts if a['severity'] in URGENT_SEVERITIES]
             
-            return {
+            dashboard = {
                 'user_id': user_id,
                 'dashboard_generated_at': datetime.now().isoformat(),
                 'conversation_insights': {
@@ -352,7 +425,7 @@ class EnhancedAgenticService:
                 },
                 'health_monitoring': {
                     'active_alerts': len(active_alerts),
-                    'urgent_alerts': len([a for a in active_alerts if a['severity'] in ['high', 'critical']]),
+                    'urgent_alerts': len(urgent_alerts),
                     'recent_insights': monitoring_results.get('insights_generated', 0),
                     'patterns_updated': monitoring_results.get('patterns_updated', 0)
                 },
@@ -367,10 +440,14 @@ class EnhancedAgenticService:
                 },
                 'alerts': active_alerts[:5],  # Top 5 alerts
                 'recommendations': self._generate_dashboard_recommendations(
-                    conversation_summary, active_alerts, meal_plans
+                    conversation_summary, urgent_alerts, meal_plans
                 )
             }
             
+            with _health_dashboard_lock:
+                _health_dashboard_cache[user_id] = dashboard
+            return dashboard
+            
         except Exception as e:
             print(f"Error generating health dashboard: {e}")
             return {'error': str(e)}
@@ -378,7 +455,7 @@ class EnhancedAgenticService:
     def _generate_dashboard_recommendations(
         self, 
         conversation_summary: Dict[str, Any], 
-        alerts: List[Dict[str, Any]], 
+        urgent_alerts: List[Dict[str, Any]], 
         meal_plans: List[Dict[str, Any]]
     ) -> List[Dict[str, Any]]:
         """Generate personalized recommendations for the dashboard"""
@@ -394,7 +471,6 @@ class EnhancedAgenticService:
             })
         
         # Alert-based recommendations
-        urgent_alerts = [a for a in alerts if a['severity'] in ['high', 'critical']]
         if urgent_alerts:
             recommendations.append({
                 'type': 'health_alert',
@@ -442,6 +518,7 @@ class EnhancedAgenticService:
             # Generate notifications for the new meal plan
             if not result.get('error'):
                 self.notification_service.generate_smart_notifications(user_id)
+                invalidate_health_dashboard(user_id)
             
             return result
             
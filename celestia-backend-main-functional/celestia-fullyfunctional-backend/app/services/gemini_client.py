@@ -0,0 +1,24 @@
+import asyncio
+
+import google.generativeai as genai
+
+from app.config import settings
+
+# Configure the SDK once for the whole process. configure() drops the SDK's cached
+# clients, so it must not be repeated per service; every model below then shares
+# one gRPC channel and its connections stay warm between requests.
+genai.configure(api_key=settings.google_api_key, transport="grpc")
+
+GEMINI_MODEL_NAME = "models/gemini-2.0-flash"
+
+# Shared model handle; services import it under their own names
+gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+
+# Gemini requests in flight from async callers; callers past the limit queue here instead of
+# piling more blocking calls onto the worker threads
+_gemini_slots = asyncio.Semaphore(settings.gemini_max_concurrency)
+
+async def generate_content_async(*args, **kwargs):
+    """gemini_model.generate_content on a worker thread, at most gemini_max_concurrency at a time"""
+    async with _gemini_slots:
+        return await asyncio.to_thread(gemini_model.generate_content, *args, **kwargs)
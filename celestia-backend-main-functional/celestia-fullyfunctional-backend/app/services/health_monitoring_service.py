@@ -1,11 +1,26 @@
 from datetime import datetime, timedelta, date
 from typing import Dict, Any, List, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, and_, func
+from sqlalchemy import desc, and_, or_, func
 from app.models.agentic_models import HealthAlert, UserBehaviorPattern, PredictiveInsight
 from app.models.db_models import User, Meal, DailySummary
+from cachetools import TTLCache
 import json
 import statistics
+import threading
+
+# Alert severities that count as urgent wherever alerts are summarised
+URGENT_SEVERITIES = frozenset(('high', 'critical'))
+
+# Monitoring results by user_id. Chat and the health dashboard both want a monitoring run; within
+# this window they share one. New meals and alert changes drop the entry (invalidate_health_monitoring).
+_monitoring_cache = TTLCache(maxsize=10000, ttl=60)
+_monitoring_lock = threading.Lock()
+
+def invalidate_health_monitoring(user_id: int):
+    """Drop a user's memoized monitoring results"""
+    with _monitoring_lock:
+        _monitoring_cache.pop(user_id, None)
 
 class HealthMonitoringService:
     def __init__(self, db: Session):
@@ -58,7 +73,7 @@ class HealthMonitoringService:
             risk_alerts = self._assess_health_risks(user_id, recent_meals, daily_summaries)
             alerts_generated.extend(risk_alerts)
             
-            return {
+            results = {
                 'monitoring_completed': True,
                 'alerts_generated': len(alerts_generated),
                 'patterns_updated': len(patterns_updated),
@@ -68,6 +83,9 @@ class HealthMonitoringService:
                 'insights': insights_generated,
                 'monitoring_date': datetime.now().isoformat()
             }
+            with _monitoring_lock:
+                _monitoring_cache[user_id] = results
+            return results
             
         except Exception as e:
             print(f"Error in health monitoring: {e}")
@@ -468,6 +486,14 @@ class HealthMonitoringService:
             print(f"Error generating predictive insights: {e}")
             return insights
     
+    def get_recent_monitoring(self, user_id: int) -> Dict[str, Any]:
+        """Results of a monitoring run from the last minute if there is one, otherwise a fresh run"""
+        with _monitoring_lock:
+            cached = _monitoring_cache.get(user_id)
+        if cached is not None:
+            return cached
+        return self.run_health_monitoring(user_id)
+    
     def get_active_alerts(self, user_id: int) -> List[Dict[str, Any]]:
         """Get all active alerts for a user"""
         try:
@@ -517,6 +543,7 @@ class HealthMonitoringService:
             if alert:
                 alert.is_dismissed = True
                 self.db.commit()
+                invalidate_health_monitoring(user_id)
                 return True
             
             return False
@@ -539,6 +566,7 @@ class HealthMonitoringService:
             if alert:
                 alert.is_read = True
                 self.db.commit()
+                invalidate_health_monitoring(user_id)
                 return True
             
             return False
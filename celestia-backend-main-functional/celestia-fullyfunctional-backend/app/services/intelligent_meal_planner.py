@@ -6,12 +6,8 @@ from app.models.agentic_models import MealPlan, MealPlanItem, UserBehaviorPatter
 from app.models.db_models import User, Meal, DailySummary
 import json
 import random
-import google.generativeai as genai
-from app.config import settings
+from app.services.gemini_client import gemini_model as meal_planner_model
 
-# Configure Gemini AI
-genai.configure(api_key=settings.google_api_key)
-meal_planner_model = genai.GenerativeModel("models/gemini-2.0-flash")
 
 class IntelligentMealPlanner:
     def __init__(self, db: Session):
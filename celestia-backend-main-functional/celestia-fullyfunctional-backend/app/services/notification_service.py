@@ -2,7 +2,7 @@ import smtplib
 import random
 import string
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
@@ -12,15 +12,12 @@ import jwt
 
 from twilio.rest import Client
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, func
 
 from app.config import settings
 from app.models.db_models import User, NotificationLog, Meal, DailySummary
-import google.generativeai as genai
+from app.services.gemini_client import gemini_model as content_model
 
-# Configure Gemini for content generation
-genai.configure(api_key=settings.google_api_key)
-content_model = genai.GenerativeModel("models/gemini-2.0-flash")
 
 class NotificationService:
     """
@@ -193,7 +190,8 @@ class NotificationService:
             # Generate OTP
             otp = self.generate_otp()
             
-            # Store OTP in database with expiration (5 minutes)
+            # Store the number and OTP (5 minute expiry) in a single commit
+            user.phone_number = phone_number
             user.phone_otp = otp
             user.phone_otp_expires = datetime.now() + timedelta(minutes=5)
             self.db.commit()
@@ -713,14 +711,18 @@ FITKIT Team 🌟"""
             print(f"Notification logging error: {e}")
             self.db.rollback()
     
-    def get_notification_history(self, user_id: int, limit: int = 50) -> List[Dict[str, Any]]:
-        """Get user's notification history"""
+    def get_notification_history(self, user_id: int, limit: int = 50) -> Tuple[List[Dict[str, Any]], int]:
+        """Get user's most recent notifications and their total count"""
         try:
-            notifications = self.db.query(NotificationLog).filter(
+            # COUNT(*) OVER () is evaluated before LIMIT, so it is the user's full total
+            rows = self.db.query(
+                NotificationLog,
+                func.count().over().label("total")
+            ).filter(
                 NotificationLog.user_id == user_id
             ).order_by(NotificationLog.created_at.desc()).limit(limit).all()
             
-            return [
+            history = [
                 {
                     "id": notif.id,
                     "type": notif.notification_type,
@@ -730,12 +732,13 @@ FITKIT Team 🌟"""
                     "created_at": notif.created_at.isoformat(),
                     "error": notif.error_message
                 }
-                for notif in notifications
+                for notif, _ in rows
             ]
+            return history, rows[0].total if rows else 0
             
         except Exception as e:
             print(f"Notification history error: {e}")
-            return []
+            return [], 0
     
     def update_notification_preferences(self, user_id: int, preferences: Dict[str, Any]) -> Dict[str, Any]:
         """Update user's notification preferences"""
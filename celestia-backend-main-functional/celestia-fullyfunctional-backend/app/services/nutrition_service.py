@@ -1,11 +1,8 @@
 from typing import Dict, Any
 import json
-import google.generativeai as genai
-from app.config import settings
+from app.services.gemini_client import gemini_model
 from .analysis_service import clean_json_response
 
-genai.configure(api_key=settings.google_api_key)
-gemini_model = genai.GenerativeModel("models/gemini-2.0-flash")
 
 def nutrition_lookup(analysis_data: Dict[str, Any]) -> Dict[str, Any]:
     prompt = f"""You are a nutrition expert specializing in Indian cuisine. Provide detailed nutrition facts using ICMR (Indian Council of Medical Research) guidelines and Indian food composition tables for items: {json.dumps(analysis_data.get('items', []))}. 
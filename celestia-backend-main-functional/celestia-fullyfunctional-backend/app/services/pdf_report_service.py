@@ -19,12 +19,8 @@ from sqlalchemy.orm import Session
 from sqlalchemy import and_
 
 from app.models.db_models import User, Meal, DailySummary
-from app.config import settings
-import google.generativeai as genai
+from app.services.gemini_client import gemini_model as insights_model
 
-# Configure Gemini for insights generation
-genai.configure(api_key=settings.google_api_key)
-insights_model = genai.GenerativeModel("models/gemini-2.0-flash")
 
 class PDFReportService:
     """
@@ -1,11 +1,8 @@
 from typing import Dict, Any, List
-import google.generativeai as genai
-from app.config import settings
+from app.services.gemini_client import gemini_model
 from .analysis_service import clean_json_response
 import json
 
-genai.configure(api_key=settings.google_api_key)
-gemini_model = genai.GenerativeModel("models/gemini-2.0-flash")
 
 def healthy_swaps(analysis_data: Dict[str, Any]) -> List[Dict[str, Any]]:
     prompt = f"""You are a nutrition expert specializing in Indian cuisine. Suggest culturally appropriate healthy swaps for {json.dumps(analysis_data.get('items', []))}. 
@@ -0,0 +1,77 @@
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+import orjson
+from cachetools import TTLCache
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_KEY_PREFIX = "llm:"
+
+
+def prompt_key(prompt: str) -> str:
+    """Cache key for a fully built prompt; identical prompts get identical replies"""
+    return RESPONSE_KEY_PREFIX + hashlib.sha256(prompt.encode()).hexdigest()[:32]
+
+
+class ResponseCache:
+    """In-process cache of generated replies with TTL eviction.
+
+    Values are stored as orjson bytes so every hit hands out a fresh dict.
+    """
+
+    def __init__(self, ttl: int, maxsize: int = 4096):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            payload = self._cache.get(key)
+        return orjson.loads(payload) if payload is not None else None
+
+    def set(self, key: str, value: Dict[str, Any]):
+        with self._lock:
+            self._cache[key] = orjson.dumps(value)
+
+
+class RedisResponseCache:
+    """Redis-backed reply cache shared by all workers.
+
+    Redis errors are treated as misses, so an unavailable cache only
+    costs the Gemini call it would have saved.
+    """
+
+    def __init__(self, url: str, ttl: int):
+        import redis
+
+        self.ttl = ttl
+        self._errors = redis.RedisError
+        self._redis = redis.Redis(connection_pool=redis.ConnectionPool.from_url(url))
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            payload = self._redis.get(key)
+        except self._errors:
+            logger.warning("Response cache read failed", exc_info=True)
+            return None
+        return orjson.loads(payload) if payload is not None else None
+
+    def set(self, key: str, value: Dict[str, Any]):
+        try:
+            self._redis.set(key, orjson.dumps(value), ex=self.ttl)
+        except self._errors:
+            logger.warning("Response cache write failed", exc_info=True)
+
+
+def create_response_cache():
+    """Use Redis when REDIS_URL is configured, otherwise cache in-process"""
+    if settings.redis_url:
+        return RedisResponseCache(settings.redis_url, settings.response_cache_ttl)
+    return ResponseCache(settings.response_cache_ttl)
+
+
+response_cache = create_response_cache()
@@ -0,0 +1,175 @@
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+import orjson
+
+from app.config import settings
+
+# Analysis sessions are abandoned after 30 minutes of inactivity
+SESSION_TTL_SECONDS = 30 * 60
+
+SESSION_IMAGE_DIR = os.path.join(tempfile.gettempdir(), "fitkit_sessions")
+
+SESSION_KEY_PREFIX = "sess:"
+
+# Server-side bookkeeping that never goes back to clients
+INTERNAL_SESSION_KEYS = frozenset(("image_path",))
+
+
+def public_session_data(session: Dict[str, Any]) -> Dict[str, Any]:
+    """Session as returned to clients, without file paths or store keys"""
+    return {key: value for key, value in session.items() if key not in INTERNAL_SESSION_KEYS}
+
+
+class SessionStore:
+    """In-process analysis session store with TTL eviction.
+
+    Uploaded images are kept on disk and only their path is stored in the
+    session, so no decoded pixel buffers stay pinned in memory.
+    """
+
+    def __init__(self, ttl: int = SESSION_TTL_SECONDS):
+        self.ttl = ttl
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._expires_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        expired = [sid for sid, expires in self._expires_at.items() if expires <= now]
+        for session_id in expired:
+            self._remove(session_id)
+
+    def _remove(self, session_id: str):
+        session = self._sessions.pop(session_id, None)
+        self._expires_at.pop(session_id, None)
+        if session and session.get("image_path"):
+            try:
+                os.remove(session["image_path"])
+            except OSError:
+                pass
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            self._purge_expired()
+            return session_id in self._sessions
+
+    def __getitem__(self, session_id: str) -> Dict[str, Any]:
+        with self._lock:
+            self._purge_expired()
+            session = self._sessions[session_id]
+            self._expires_at[session_id] = time.monotonic() + self.ttl
+            return session
+
+    def __setitem__(self, session_id: str, session: Dict[str, Any]):
+        with self._lock:
+            self._sessions[session_id] = session
+            self._expires_at[session_id] = time.monotonic() + self.ttl
+
+    def __delitem__(self, session_id: str):
+        with self._lock:
+            if session_id not in self._sessions:
+                raise KeyError(session_id)
+            self._remove(session_id)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            self._purge_expired()
+            return iter(list(self._sessions))
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._purge_expired()
+            return len(self._sessions)
+
+    def save_image(self, session_id: str, image_bytes: bytes) -> str:
+        """Write the uploaded image to disk and return its path"""
+        os.makedirs(SESSION_IMAGE_DIR, exist_ok=True)
+        path = os.path.join(SESSION_IMAGE_DIR, f"{session_id}.jpg")
+        with open(path, "wb") as f:
+            f.write(image_bytes)
+        return path
+
+    def load_image(self, session_id: str) -> Optional[bytes]:
+        """Return the uploaded image bytes, or None if nothing was uploaded"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            path = session.get("image_path") if session else None
+        if not path:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+
+class RedisSessionStore:
+    """Redis-backed analysis session store shared by all workers.
+
+    Sessions are stored as JSON under ``sess:<id>`` with a sliding TTL, and
+    the uploaded image under ``sess:<id>:image``. Values are copies, so
+    callers must assign a modified session back to persist it.
+    """
+
+    def __init__(self, url: str, ttl: int = SESSION_TTL_SECONDS):
+        import redis
+
+        self.ttl = ttl
+        self._redis = redis.Redis(connection_pool=redis.ConnectionPool.from_url(url))
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"{SESSION_KEY_PREFIX}{session_id}"
+
+    @staticmethod
+    def _image_key(session_id: str) -> str:
+        return f"{SESSION_KEY_PREFIX}{session_id}:image"
+
+    def __contains__(self, session_id: str) -> bool:
+        return bool(self._redis.exists(self._key(session_id)))
+
+    def __getitem__(self, session_id: str) -> Dict[str, Any]:
+        payload = self._redis.getex(self._key(session_id), ex=self.ttl)
+        if payload is None:
+            raise KeyError(session_id)
+        self._redis.expire(self._image_key(session_id), self.ttl)
+        return orjson.loads(payload)
+
+    def __setitem__(self, session_id: str, session: Dict[str, Any]):
+        self._redis.set(self._key(session_id), orjson.dumps(session), ex=self.ttl)
+
+    def __delitem__(self, session_id: str):
+        if not self._redis.delete(self._key(session_id), self._image_key(session_id)):
+            raise KeyError(session_id)
+
+    def __iter__(self) -> Iterator[str]:
+        prefix_len = len(SESSION_KEY_PREFIX)
+        return iter([
+            key.decode()[prefix_len:]
+            for key in self._redis.scan_iter(match=f"{SESSION_KEY_PREFIX}*")
+            if not key.endswith(b":image")
+        ])
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def save_image(self, session_id: str, image_bytes: bytes) -> str:
+        """Store the uploaded image next to the session and return its key"""
+        key = self._image_key(session_id)
+        self._redis.set(key, image_bytes, ex=self.ttl)
+        return key
+
+    def load_image(self, session_id: str) -> Optional[bytes]:
+        """Return the uploaded image bytes, or None if nothing was uploaded"""
+        return self._redis.get(self._image_key(session_id))
+
+
+def create_session_store():
+    """Use Redis when REDIS_URL is configured, otherwise keep sessions in-process"""
+    if settings.redis_url:
+        return RedisSessionStore(settings.redis_url)
+    return SessionStore()
@@ -47,8 +47,7 @@ def log_meal(db: Session, user_id: int, analysis_data: Dict, portion_estimates:
             nutrition_summary=nutrition_summary or {},
             recommendations=recommendations or {},
             upload_date=now.date(),
-            upload_time=now,
-            day_of_week=now.strftime("%A")  # Monday, Tuesday, etc.
+            upload_time=now
         )
         db.add(meal)
         
@@ -69,6 +68,16 @@ def log_meal(db: Session, user_id: int, analysis_data: Dict, portion_estimates:
             print(f"Failed to update daily summary: {dashboard_error}")
             # Don't fail the meal logging if dashboard update fails
         
+        # Cached agent context and dashboards no longer reflect this user's meals
+        from app.services.agent_service import invalidate_user_context
+        from app.services.dashboard_service import invalidate_daily_dashboard
+        from app.services.enhanced_agent_service import invalidate_health_dashboard
+        from app.services.health_monitoring_service import invalidate_health_monitoring
+        invalidate_user_context(user_id)
+        invalidate_daily_dashboard(user_id)
+        invalidate_health_dashboard(user_id)
+        invalidate_health_monitoring(user_id)
+        
         return meal
     except Exception as e:
         db.rollback()
@@ -69,12 +69,13 @@ def migrate_database():
                 else:
                     raise e
             
+            # Day of week is derived from upload_date on read now
             try:
-                connection.execute(text("ALTER TABLE meals ADD COLUMN day_of_week VARCHAR(20)"))
-                print("✓ Added day_of_week column to meals table")
+                connection.execute(text("ALTER TABLE meals DROP COLUMN day_of_week"))
+                print("✓ Dropped day_of_week column from meals table")
             except Exception as e:
-                if "duplicate column name" in str(e).lower() or "already exists" in str(e).lower():
-                    print("✓ day_of_week column already exists in meals table")
+                if "no such column" in str(e).lower() or "does not exist" in str(e).lower():
+                    print("✓ day_of_week column already absent from meals table")
                 else:
                     raise e
             
@@ -121,15 +122,6 @@ def migrate_database():
                 UPDATE meals 
                 SET upload_date = date(created_at),
                     upload_time = created_at,
-                    day_of_week = CASE cast(strftime('%w', created_at) as integer)
-                        WHEN 0 THEN 'Sunday'
-                        WHEN 1 THEN 'Monday'
-                        WHEN 2 THEN 'Tuesday'
-                        WHEN 3 THEN 'Wednesday'
-                        WHEN 4 THEN 'Thursday'
-                        WHEN 5 THEN 'Friday'
-                        WHEN 6 THEN 'Saturday'
-                    END,
                     updated_at = created_at
                 WHERE upload_date IS NULL OR upload_time IS NULL
             """))
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Database migration script to add query indexes to existing tables
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text
+from app.database import engine
+
+# (index name, table, columns) - must match __table_args__ on the models
+INDEXES = [
+    ("ix_meals_user_date_time", "meals", "user_id, upload_date, upload_time"),
+    ("ix_notif_user_created", "notification_logs", "user_id, created_at"),
+    ("ix_cm_user_session_created", "conversation_memory", "user_id, session_id, created_at"),
+    ("ix_cm_user_created_imp", "conversation_memory", "user_id, created_at, importance_score"),
+]
+
+# (index name, table, columns) - unique; duplicate rows are removed first, keeping the newest id
+UNIQUE_INDEXES = [
+    ("uq_daily_summary_user_date", "daily_summaries", "user_id, date"),
+]
+
+# Indexes superseded by the ones above
+DROPPED_INDEXES = ["ix_daily_user_date", "ix_meals_user_date"]
+
+# Postgres only: trigram indexes so the ILIKE '%term%' conversation search can use an index
+POSTGRES_TRGM_INDEXES = [
+    ("ix_cm_content_trgm", "conversation_memory", "content gin_trgm_ops"),
+]
+
+def migrate_indexes():
+    """Create any missing indexes"""
+    
+    with engine.connect() as connection:
+        # Start a transaction
+        trans = connection.begin()
+        
+        try:
+            print("Starting index migration...")
+            
+            for name, table, columns in INDEXES:
+                connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+                print(f"✓ Index {name} on {table} ({columns})")
+            
+            for name, table, columns in UNIQUE_INDEXES:
+                removed = connection.execute(text(
+                    f"DELETE FROM {table} WHERE id NOT IN (SELECT MAX(id) FROM {table} GROUP BY {columns})"
+                )).rowcount
+                if removed:
+                    print(f"✓ Removed {removed} duplicate rows from {table}")
+                connection.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+                print(f"✓ Unique index {name} on {table} ({columns})")
+            
+            for name in DROPPED_INDEXES:
+                connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+                print(f"✓ Dropped index {name}")
+            
+            if engine.dialect.name == "postgresql":
+                connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                for name, table, columns in POSTGRES_TRGM_INDEXES:
+                    connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({columns})"))
+                    print(f"✓ Trigram index {name} on {table} ({columns})")
+            
+            # Commit the transaction
+            trans.commit()
+            print("✅ Index migration completed successfully!")
+            
+        except Exception as e:
+            # Rollback on error
+            trans.rollback()
+            print(f"❌ Index migration failed: {e}")
+            raise e
+
+if __name__ == "__main__":
+    migrate_indexes()
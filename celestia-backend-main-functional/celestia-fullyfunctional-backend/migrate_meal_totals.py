@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Database migration script to add denormalized nutrient totals to meals
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import case, func, inspect, text, update
+from app.database import engine
+from app.models.db_models import Meal, NUTRIENT_TOTAL_FIELDS
+
+def stored_number(field):
+    """analysis_data[field] when it holds a JSON number, else 0, matching Meal._copy_nutrient_totals"""
+    if engine.dialect.name == "postgresql":
+        is_number = func.json_typeof(Meal.analysis_data[field]) == "number"
+    else:
+        is_number = func.json_type(Meal.analysis_data, f"$.{field}").in_(("integer", "real"))
+    return case((is_number, Meal.analysis_data[field].as_float()), else_=0.0)
+
+def migrate_meal_totals():
+    """Add the nutrient total columns to meals and fill them from analysis_data"""
+    
+    existing_columns = {column["name"] for column in inspect(engine).get_columns("meals")}
+    
+    with engine.connect() as connection:
+        # Start a transaction
+        trans = connection.begin()
+        
+        try:
+            print("Starting meal totals migration...")
+            
+            for field in NUTRIENT_TOTAL_FIELDS:
+                if field in existing_columns:
+                    print(f"✓ {field} column already exists in meals table")
+                    continue
+                connection.execute(text(f"ALTER TABLE meals ADD COLUMN {field} FLOAT DEFAULT 0.0"))
+                print(f"✓ Added {field} column to meals table")
+            
+            # Backfill every meal from its stored analysis
+            print("Backfilling nutrient totals from analysis_data...")
+            # updated_at is carried over explicitly, or its onupdate would stamp every meal as just edited
+            result = connection.execute(update(Meal).values({
+                **{field: stored_number(field) for field in NUTRIENT_TOTAL_FIELDS},
+                "updated_at": Meal.updated_at
+            }))
+            print(f"✓ Updated {result.rowcount} meals")
+            
+            # Commit the transaction
+            trans.commit()
+            print("✅ Meal totals migration completed successfully!")
+            
+        except Exception as e:
+            # Rollback on error
+            trans.rollback()
+            print(f"❌ Meal totals migration failed: {e}")
+            raise e
+
+if __name__ == "__main__":
+    migrate_meal_totals()